@@ -0,0 +1,48 @@
+"""
+JWT authentication that skips the user lookup on read requests.
+"""
+from django.conf import settings
+from django.utils.functional import cached_property
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+
+class ClaimUser(TokenUser):
+    """
+    TokenUser whose id is the integer primary key, so it compares with Trip.user_id
+    """
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+
+class StatelessReadJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that, for GET/HEAD/OPTIONS while settings.JWT_STATELESS_READS is on,
+    trusts the validated token's user id claim and returns a ClaimUser instead of loading
+    the CustomUser row. Writes still load the user. A deleted or deactivated user keeps
+    read access until their access token expires (SIMPLE_JWT ACCESS_TOKEN_LIFETIME).
+    """
+
+    def authenticate(self, request):
+        if not (settings.JWT_STATELESS_READS and request.method in SAFE_METHODS):
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("Token contained no recognizable user identification")
+        return ClaimUser(validated_token), validated_token
@@ -0,0 +1,60 @@
+"""
+Sends trip reads to the 'replica' database (settings.DATABASE_REPLICA_URL) inside
+views marked with read_from_replica. Everything else, writes included, stays on
+the default database. Replicas lag a little, so a trip edited a moment ago can
+still read as its old version there.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+REPLICA_DB = "replica"
+
+# Caches are written on nearly every read, so only the trip tables go to the replica
+REPLICA_MODELS = {"api.trip", "api.tripeldlog"}
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_from_replica(view):
+    """
+    Run a (sync) view or viewset method with trip reads routed to the replica
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapped
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and model._meta.label_lower in REPLICA_MODELS and REPLICA_DB in settings.DATABASES:
+            return REPLICA_DB
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        databases = {"default", REPLICA_DB}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DB:
+            return False
+        return None
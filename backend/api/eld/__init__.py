@@ -0,0 +1,15 @@
+"""
+Hours-of-service ELD log engine.
+
+Pure Python with no Django imports, so it can run in views, batch jobs and
+worker processes alike. Fetch the drive legs first (api.routing), then:
+
+    plan = plan_trip(trip, legs)
+    plan.to_dict()  # trip_details response format
+"""
+from .constants import *  # noqa: F401,F403
+from .engine import HosPolicy, find_next_event_step, iter_plan_days, plan_trip, plan_trip_dict, plan_trip_summary, trip_stops
+from .gazetteer import Gazetteer
+from .records import EldPlan, Location, LogEntry, rebase_plan_dates
+
+__all__ = ["plan_trip", "plan_trip_dict", "plan_trip_summary", "iter_plan_days", "trip_stops", "HosPolicy", "Gazetteer", "find_next_event_step", "EldPlan", "Location", "LogEntry", "rebase_plan_dates"]
@@ -0,0 +1,22 @@
+# Bump whenever plan_trip output changes so stored logs get recomputed
+ENGINE_VERSION = 5
+
+MAX_DRIVE_HOURS_PER_DAY = 11
+MAX_ON_DUTY_HOURS_PER_DAY = 14 
+MAX_DRIVE_HOURS_BEFORE_BREAK = 8
+MAX_WEEKLY_HOURS = 70 #(70-hour/8-day rule)
+FUEL_STOP_DISTANCE = 1000         # Miles before requiring a fuel stop
+BREAK_MINUTES = 30                # Minutes off duty for the break after MAX_DRIVE_HOURS_BEFORE_BREAK
+FUEL_STOP_MINUTES = 30            # Minutes on duty per fuel stop
+PICKUP_DROPOFF_TIME = 60          # Minutes for pickup/dropoff activities
+
+# ELD activity status codes
+STATUS_DRIVING = "D"              # Driving
+STATUS_ON_DUTY = "ON"             # On-duty not driving
+STATUS_OFF_DUTY = "OFF"           # Off-duty
+STATUS_SLEEPER = "SB"             # Sleeper berth
+
+# Slack when searching for limit crossings, so rounding can only make a step get checked early
+EVENT_SEARCH_EPSILON = 1e-6
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
@@ -0,0 +1,601 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+
+from .constants import (
+    BREAK_MINUTES,
+    EVENT_SEARCH_EPSILON,
+    FUEL_STOP_DISTANCE,
+    FUEL_STOP_MINUTES,
+    MAX_DRIVE_HOURS_BEFORE_BREAK,
+    MAX_DRIVE_HOURS_PER_DAY,
+    MAX_WEEKLY_HOURS,
+    PICKUP_DROPOFF_TIME,
+    STATUS_DRIVING,
+    STATUS_OFF_DUTY,
+    STATUS_ON_DUTY,
+    STATUS_SLEEPER,
+    TIME_FORMAT,
+)
+from .records import EldPlan, Location, LogEntry, summarize_day
+from ..geo import cumulative_lengths, decode_polyline, polyline_position
+
+SHIFT_START = time(6, 30)
+INFINITY = float("inf")
+
+
+def find_next_event_step(cumulative_durations, cumulative_distances, start, hours_to_midnight, remaining_hours, remaining_miles):
+    """
+    Find the first step from `start` that ends past midnight or crosses a drive-hour limit
+    (remaining_hours) or the fuel distance (remaining_miles), using binary search over the
+    cumulative step durations and distances. Returns the step count if no step does, so
+    every step before the returned index can be driven without checking limits.
+    """
+    base_duration = cumulative_durations[start]
+    event_index = bisect_left(cumulative_durations, base_duration + hours_to_midnight - EVENT_SEARCH_EPSILON, start + 1) - 1
+
+    # Limits that are already used up are never hit (see EldPlanner.drive_step)
+    for remaining in remaining_hours:
+        if remaining > 0:
+            crossing = bisect_right(cumulative_durations, base_duration + remaining - EVENT_SEARCH_EPSILON, start + 1) - 1
+            event_index = min(event_index, crossing)
+    if remaining_miles > 0:
+        crossing = bisect_right(cumulative_distances, cumulative_distances[start] + remaining_miles - EVENT_SEARCH_EPSILON, start + 1) - 1
+        event_index = min(event_index, crossing)
+
+    return event_index
+
+
+def locate(lat, lon, gazetteer=None):
+    """
+    Location for a point along the route, named from the gazetteer when one is given
+    """
+    return Location(lat, lon, gazetteer.name(lat, lon) if gazetteer else None)
+
+
+class StepTracks:
+    """
+    Road paths of a leg's steps, each decoded with its cumulative drive time the first time
+    a stop lands on the step and then reused for every later stop along it
+    """
+    __slots__ = ("steps", "tracks")
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.tracks = {}
+
+    def position(self, index, progress):
+        """
+        (lat, lon) `progress` (0 to 1) of the drive time through steps[index]: on the step's
+        road geometry when the route has it, else on the straight line between its endpoints
+        """
+        if index not in self.tracks:
+            self.tracks[index] = step_track(self.steps[index])
+        track = self.tracks[index]
+        if track:
+            points, cumulative = track
+            return polyline_position(points, progress, cumulative)
+        step = self.steps[index]
+        start, end = step['start_location'], step['end_location']
+        return (
+            start['lat'] + progress * (end['lat'] - start['lat']),
+            start['lon'] + progress * (end['lon'] - start['lon']),
+        )
+
+
+def step_track(step):
+    """
+    (points, cumulative drive time at each point) of a step's geometry, or None without one.
+    Uses the per-node durations from the routing provider when they fit the geometry, else
+    assumes a constant speed along the step.
+    """
+    if not step.get('geometry'):
+        return None
+    points = decode_polyline(step['geometry'])
+    if len(points) < 2:
+        return None
+    node_durations = step.get('node_durations')
+    if node_durations and len(node_durations) == len(points) - 1 and sum(node_durations) > 0:
+        return points, list(accumulate(node_durations, initial=0.0))
+    return points, cumulative_lengths(points)
+
+
+class Segment:
+    __slots__ = ("name", "type", "end")
+
+    def __init__(self, name, type, end):
+        self.name = name
+        self.type = type
+        self.end = end
+
+    @property
+    def is_drive(self):
+        return self.type.startswith("drive_to_")
+
+
+def trip_stops(trip):
+    """
+    The stops the truck drives to after its current location, in order:
+    trip['stops'] ({"kind": "pickup"|"dropoff", "latitude", "longitude", "location"})
+    when given, else the trip's single pickup and dropoff
+    """
+    if trip.get('stops'):
+        return trip['stops']
+    stops = []
+    for kind in ("pickup", "dropoff"):
+        stop = {"kind": kind, "latitude": trip[f'{kind}_latitude'], "longitude": trip[f'{kind}_longitude']}
+        if f'{kind}_location' in trip:
+            stop["location"] = trip[f'{kind}_location']
+        stops.append(stop)
+    return stops
+
+
+def build_segments(trip):
+    """
+    Split a trip into drive and stationary segments: current -> stop -> stop ...
+    """
+    segments = []
+    for stop in trip_stops(trip):
+        kind = stop['kind']
+        label = kind.capitalize()
+        name = stop['location'] if 'location' in stop else f"{label} at {stop['latitude']:.4f}, {stop['longitude']:.4f}"
+        location = Location(stop['latitude'], stop['longitude'], name)
+        segments.append(Segment(f"Drive to {label}", f"drive_to_{kind}", location))
+        segments.append(Segment(f"{label} Activity", kind, location))
+    return segments
+
+
+class HosPolicy:
+    """
+    Break and fuel rules the planner applies; the defaults are the constants in api.eld.constants
+    """
+    __slots__ = ("drive_hours_before_break", "break_minutes", "fuel_stop_miles", "fuel_stop_minutes")
+
+    def __init__(self, drive_hours_before_break=MAX_DRIVE_HOURS_BEFORE_BREAK, break_minutes=BREAK_MINUTES,
+                 fuel_stop_miles=FUEL_STOP_DISTANCE, fuel_stop_minutes=FUEL_STOP_MINUTES):
+        self.drive_hours_before_break = drive_hours_before_break
+        self.break_minutes = break_minutes
+        self.fuel_stop_miles = fuel_stop_miles
+        self.fuel_stop_minutes = fuel_stop_minutes
+
+
+DEFAULT_POLICY = HosPolicy()
+
+
+class EldPlanner:
+    """
+    Hours-of-service simulation state for one trip. Use plan_trip() rather than this directly.
+    """
+    __slots__ = (
+        "days", "current_time", "current_day", "day_count", "destination_reached",
+        "truck_location", "last_logged_location",
+        "weekly_drive_hours", "daily_drive_hours", "daily_on_duty_hours", "drive_hours_since_break",
+        "total_miles", "miles_since_fuel",
+        "current_status", "current_status_start", "current_status_miles", "current_status_location",
+        "current_status_note", "current_activity_type", "gazetteer", "policy", "stop_counts",
+    )
+
+    def __init__(self, start_location, shift_start_time, weekly_drive_hours, gazetteer=None, policy=None):
+        self.gazetteer = gazetteer
+        self.policy = policy or DEFAULT_POLICY
+        # Planned breaks, fuel stops and 34-hour restarts
+        self.stop_counts = {"breaks": 0, "fuel_stops": 0, "restarts": 0}
+        # Keep track of physical truck location separately from segment locations
+        self.truck_location = start_location
+        self.days = {shift_start_time.date(): []}
+        self.last_logged_location = None
+
+        midnight = datetime.combine(shift_start_time.date(), time())
+        if shift_start_time > midnight:
+            self.add_log_entry(STATUS_OFF_DUTY, midnight, shift_start_time, start_location, 0, "Off duty - Before shift start")
+            # 30 minutes of pre-trip inspection
+            self.add_log_entry(STATUS_ON_DUTY, shift_start_time, shift_start_time + timedelta(minutes=30), start_location, 0, "Pre-trip /TIV")
+
+        self.current_time = shift_start_time + timedelta(minutes=30)
+        self.current_day = shift_start_time.date()
+        self.day_count = 1
+        self.destination_reached = False
+
+        self.weekly_drive_hours = weekly_drive_hours
+        self.daily_drive_hours = 0.0
+        self.daily_on_duty_hours = 0.0
+        self.drive_hours_since_break = 0.0
+        self.total_miles = 0.0
+        self.miles_since_fuel = 0.0
+
+        self.current_status = None
+        self.current_status_start = None
+        self.current_status_miles = 0.0
+        self.current_status_location = None
+        self.current_status_note = None
+        self.current_activity_type = None
+
+    def add_log_entry(self, status, start_time, end_time, location, miles, note):
+        # If location is null, use the last known location, then the truck's current location
+        if location is None:
+            location = self.last_logged_location
+        if location is None:
+            location = self.truck_location
+        self.last_logged_location = location
+
+        duration = (end_time - start_time).total_seconds() / 3600
+        day = start_time.date()
+        end_day = end_time.date()
+        # for edge case here it is not possible for a log to reach the next day on max duty hours around 14 hours and day starts at 6:30
+        if day != end_day:
+            midnight = start_time.replace(hour=23, minute=59, second=59)
+            next_day = (midnight + timedelta(seconds=1)).replace(hour=0, minute=0, second=0)
+            duration_first_day = (midnight - start_time).total_seconds() / 3600
+
+            self.days.setdefault(day, []).append(LogEntry(
+                status, start_time, midnight, duration_first_day, location,
+                miles * (duration_first_day / duration) if duration > 0 else 0, note,
+            ))
+            self.days.setdefault(end_day, []).append(LogEntry(
+                status, next_day, end_time, duration - duration_first_day, location,
+                miles * ((duration - duration_first_day) / duration) if duration > 0 else 0,
+                note + " (continued from previous day)",
+            ))
+        else:
+            self.days.setdefault(day, []).append(LogEntry(status, start_time, end_time, duration, location, miles, note))
+
+    def flush_current_status(self):
+        if self.current_status is not None:
+            self.add_log_entry(
+                self.current_status,
+                self.current_status_start,
+                self.current_time,
+                self.current_status_location,
+                self.current_status_miles,
+                self.current_status_note or "Unknown activity",
+            )
+            self.current_status = None
+            self.current_status_start = None
+            self.current_status_miles = 0.0
+            self.current_status_location = None
+            self.current_status_note = None
+            self.current_activity_type = None
+
+    def add_activity(self, status, duration, note):
+        """
+        Log a stationary activity of `duration` at the truck's current location
+        """
+        end_time = self.current_time + duration
+        self.add_log_entry(status, self.current_time, end_time, self.truck_location, 0, note)
+        self.current_time = end_time
+
+    def start_driving(self, miles, activity_type, note):
+        self.flush_current_status()
+        self.current_status = STATUS_DRIVING
+        self.current_status_start = self.current_time
+        self.current_status_miles = miles
+        self.current_status_location = self.truck_location
+        self.current_status_note = note
+        self.current_activity_type = activity_type
+
+    def accumulate_driving(self, distance, duration):
+        self.total_miles += distance
+        self.miles_since_fuel += distance
+        self.daily_drive_hours += duration
+        self.daily_on_duty_hours += duration
+        self.weekly_drive_hours += duration
+        self.drive_hours_since_break += duration
+        self.current_time += timedelta(hours=duration)
+
+    def drive(self, distance, duration, end_location, activity_type, note):
+        if self.current_status == STATUS_DRIVING and self.current_activity_type == activity_type:
+            # Continue current driving session
+            self.current_status_miles += distance
+        else:
+            # Start a new driving session
+            self.start_driving(distance, activity_type, note)
+        self.accumulate_driving(distance, duration)
+        # Update truck location to the end of the driven stretch
+        self.truck_location = locate(end_location['lat'], end_location['lon'], self.gazetteer)
+
+    def handle_day_change(self):
+        self.flush_current_status()
+
+        standard_start_time = self.current_time.replace(hour=SHIFT_START.hour, minute=SHIFT_START.minute, second=0) + timedelta(days=1)
+        # Add sleep period at the location at the end of the day
+        rest_status = STATUS_SLEEPER if not self.destination_reached else STATUS_OFF_DUTY
+        self.add_activity(rest_status, standard_start_time - self.current_time, "Post-trip TIV/Overnight rest")
+        # 30 minutes of pre-trip inspection
+        self.add_activity(STATUS_ON_DUTY, timedelta(minutes=30), "Pre-trip /TIV")
+
+        self.daily_drive_hours = 0
+        self.daily_on_duty_hours = 0
+        self.current_day = standard_start_time.date()
+        self.day_count += 1
+
+    def drive_route(self, route, segment):
+        """
+        Drive a routed segment; a generator that yields after every driven stretch so
+        callers can stream the days completed so far (see simulate())
+        """
+        # If no steps are returned, create one step for the entire route
+        steps = route['steps'] or [{
+            'distance': route['total_distance'],
+            'duration': route['total_duration'],
+            'name': 'Direct Route',
+            'start_location': {'lat': self.truck_location.lat, 'lon': self.truck_location.lon},
+            'end_location': {'lat': segment.end.lat, 'lon': segment.end.lon},
+        }]
+        # Skip steps with negligible duration or distance
+        steps = [step for step in steps if step['duration'] >= 0.01 and step['distance'] >= 0.1]
+        cumulative_durations = list(accumulate((step['duration'] for step in steps), initial=0.0))
+        cumulative_distances = list(accumulate((step['distance'] for step in steps), initial=0.0))
+        tracks = StepTracks(steps)
+
+        step_index = 0
+        # (hours, miles) still to drive of steps[step_index] after a stop or day change cut it short
+        step_left = None
+        while step_index < len(steps):
+            if step_left is not None:
+                step_left = self.drive_step(tracks, step_index, segment, *step_left)
+                if step_left is None:
+                    step_index += 1
+                yield
+                continue
+
+            # Drive every step before the next day change or limit crossing in one go
+            next_midnight = datetime.combine(self.current_day + timedelta(days=1), time())
+            event_index = find_next_event_step(
+                cumulative_durations,
+                cumulative_distances,
+                step_index,
+                (next_midnight - self.current_time).total_seconds() / 3600,
+                [
+                    self.policy.drive_hours_before_break - self.drive_hours_since_break,
+                    MAX_DRIVE_HOURS_PER_DAY - self.daily_drive_hours,
+                    MAX_WEEKLY_HOURS - self.weekly_drive_hours,
+                ],
+                self.policy.fuel_stop_miles - self.miles_since_fuel,
+            )
+            if event_index > step_index:
+                self.drive(
+                    cumulative_distances[event_index] - cumulative_distances[step_index],
+                    cumulative_durations[event_index] - cumulative_durations[step_index],
+                    steps[event_index - 1]['end_location'],
+                    segment.type,
+                    segment.name,
+                )
+                step_index = event_index
+                yield
+                continue
+
+            # A day change or limit may happen during this step, so check it on its own
+            step_left = self.drive_step(tracks, step_index, segment, steps[step_index]['duration'], steps[step_index]['distance'])
+            if step_left is None:
+                step_index += 1
+            yield
+
+        # After all steps, the truck is at the segment end
+        self.truck_location = segment.end
+
+    def drive_step(self, tracks, step_index, segment, step_duration, step_distance):
+        """
+        Drive the last step_duration hours / step_distance miles of tracks.steps[step_index]
+        up to the first day change or limit. Returns the (hours, miles) still left of the
+        step, None once all of it is driven.
+        """
+        step = tracks.steps[step_index]
+        # Calculate distance to fuel stop
+        miles_to_fuel = self.policy.fuel_stop_miles - self.miles_since_fuel
+        hours_to_fuel = (miles_to_fuel / step_distance) * step_duration if step_distance > 0 else INFINITY
+
+        # Determine which limit will be hit first; used up limits never are, ties go to the first listed
+        limit_type, remaining_time = "break", INFINITY
+        for candidate_type, remaining in (
+            ("break", self.policy.drive_hours_before_break - self.drive_hours_since_break),
+            ("daily", MAX_DRIVE_HOURS_PER_DAY - self.daily_drive_hours),
+            ("weekly", MAX_WEEKLY_HOURS - self.weekly_drive_hours),
+            ("fuel", hours_to_fuel),
+        ):
+            if 0 < remaining < remaining_time:
+                limit_type, remaining_time = candidate_type, remaining
+
+        # A day change before the stretch up to the limit ends the day here; the rest of the step is driven the next day
+        if (self.current_time + timedelta(hours=min(remaining_time, step_duration))).date() > self.current_day:
+            self.handle_day_change()
+            return step_duration, step_distance
+
+        # Normal driving for this step (no limits hit)
+        if remaining_time >= step_duration:
+            self.drive(step_distance, step_duration, step['end_location'], segment.type, segment.name)
+            return None
+
+        # Finish current driving up to the limit point
+        remaining_distance = (remaining_time / step_duration) * step_distance
+        if self.current_status == STATUS_DRIVING:
+            self.current_status_miles += remaining_distance
+        else:
+            self.start_driving(remaining_distance, segment.type, segment.name)
+        self.accumulate_driving(remaining_distance, remaining_time)
+
+        step_left = (step_duration - remaining_time, step_distance - remaining_distance)
+
+        # Update truck location to where the limit is hit
+        self.truck_location = locate(*tracks.position(step_index, 1 - step_left[0] / step['duration']), self.gazetteer)
+
+        # Handle the specific limit that was hit
+        self.flush_current_status()
+        if limit_type == "break":
+            break_minutes = self.policy.break_minutes
+            self.add_activity(STATUS_OFF_DUTY, timedelta(minutes=break_minutes), f"{break_minutes:g}-min break")
+            self.daily_on_duty_hours += break_minutes / 60
+            self.drive_hours_since_break = 0
+            self.stop_counts["breaks"] += 1
+        elif limit_type == "fuel":
+            self.add_activity(STATUS_ON_DUTY, timedelta(minutes=self.policy.fuel_stop_minutes), "Fuel stop")
+            self.daily_on_duty_hours += self.policy.fuel_stop_minutes / 60
+            self.miles_since_fuel = 0
+            self.stop_counts["fuel_stops"] += 1
+        elif limit_type == "daily":
+            self.handle_day_change()
+        elif limit_type == "weekly":
+            self.add_activity(STATUS_OFF_DUTY, timedelta(hours=34), "34-hr restart period")
+            self.stop_counts["restarts"] += 1
+            self.weekly_drive_hours = 0
+            self.daily_drive_hours = 0
+            self.daily_on_duty_hours = 0
+            self.drive_hours_since_break = 0
+            self.current_day = self.current_time.date()
+            self.day_count += 1
+        return step_left
+
+    def log_route_error(self, error):
+        self.flush_current_status()
+        self.add_activity(STATUS_ON_DUTY, timedelta(minutes=5), f"Error fetching route: {str(error)}")
+        self.daily_on_duty_hours += 0.083
+
+    def stationary_activity(self, segment):
+        # The truck is already at the pickup/dropoff location
+        self.flush_current_status()
+        self.add_activity(STATUS_ON_DUTY, timedelta(minutes=PICKUP_DROPOFF_TIME), segment.name)
+        self.daily_on_duty_hours += PICKUP_DROPOFF_TIME / 60
+        if segment.type == "dropoff":
+            self.destination_reached = True
+
+    def pop_completed_days(self, finished=False):
+        """
+        Remove and return (day, entries) for every day before the one being simulated,
+        or for all remaining days once the simulation is `finished`. Days are added in
+        chronological order and never get entries once a later day has.
+        """
+        completed = []
+        while len(self.days) > (0 if finished else 1):
+            day = next(iter(self.days))
+            completed.append((day, self.days.pop(day)))
+        return completed
+
+    def finish(self):
+        # Add any remaining activity
+        self.flush_current_status()
+
+        # Add off-duty period after destination is reached
+        if self.destination_reached:
+            midnight = self.current_time.replace(hour=23, minute=59, second=59)
+            self.add_log_entry(STATUS_OFF_DUTY, self.current_time, midnight, self.truck_location, 0, "Post-trip TIV-5mins/Off duty")
+
+
+def default_shift_start():
+    """
+    Today's standard 06:30 shift start
+    """
+    return datetime.combine(datetime.now().date(), SHIFT_START)
+
+
+def start_planner(trip, shift_start_time, gazetteer=None, policy=None):
+    start_location = locate(trip['current_latitude'], trip['current_longitude'], gazetteer)
+    return EldPlanner(start_location, shift_start_time, float(trip.get('accumulated_weekly_hours', 0)), gazetteer, policy)
+
+
+def simulate(planner, trip, legs):
+    """
+    Run the trip's segments through the planner, yielding after every driven stretch
+    and segment so callers can pick up completed days as they happen
+    """
+    drive_legs = iter(legs)
+    for segment in build_segments(trip):
+        if segment.is_drive:
+            route = next(drive_legs)
+            if isinstance(route, Exception):
+                planner.log_route_error(route)
+            else:
+                yield from planner.drive_route(route, segment)
+        else:
+            planner.stationary_activity(segment)
+        yield
+
+    planner.finish()
+
+
+def plan_trip(trip, legs, shift_start_time=None, gazetteer=None, policy=None):
+    """
+    Simulate hours-of-service ELD logs for a trip.
+
+    trip: dict with current/pickup/dropoff latitude and longitude, optional
+    pickup_location/dropoff_location names, accumulated_weekly_hours and id.
+    legs: one structured route per drive segment (current -> pickup, pickup -> dropoff)
+    as returned by api.routing.get_route_legs, or the ValueError raised while fetching it.
+    shift_start_time: when the first shift starts, defaults to today at 06:30.
+    gazetteer: optional api.eld.gazetteer.Gazetteer naming start, break, fuel and rest
+    locations offline; without one they get "Location at lat, lon" placeholders.
+    policy: optional HosPolicy with the break and fuel rules.
+    """
+    return run_planner(trip, legs, shift_start_time, gazetteer, policy)[0]
+
+
+def run_planner(trip, legs, shift_start_time=None, gazetteer=None, policy=None):
+    """
+    Simulate the whole trip; returns the EldPlan and the finished EldPlanner
+    """
+    shift_start_time = shift_start_time or default_shift_start()
+    planner = start_planner(trip, shift_start_time, gazetteer, policy)
+    for _ in simulate(planner, trip, legs):
+        pass
+    plan = EldPlan(
+        trip.get('id', 'unknown'),
+        shift_start_time,
+        planner.current_time,
+        planner.total_miles,
+        planner.day_count,
+        planner.days,
+    )
+    return plan, planner
+
+
+def plan_trip_dict(trip, legs, shift_start_time=None, gazetteer=None, policy=None):
+    """
+    plan_trip() already rendered with to_dict(); a module-level function so it
+    can be submitted to a process pool
+    """
+    return plan_trip(trip, legs, shift_start_time, gazetteer, policy).to_dict()
+
+
+def plan_trip_summary(trip, legs, shift_start_time=None, gazetteer=None, policy=None):
+    """
+    plan_trip_dict() without the daily logs, plus the number of breaks, fuel stops and
+    34-hour restarts planned; small enough to compare many what-if plans side by side
+    """
+    plan, planner = run_planner(trip, legs, shift_start_time, gazetteer, policy)
+    summary = plan.to_dict()
+    del summary["daily_summaries"]
+    summary.update(planner.stop_counts)
+    return summary
+
+
+def iter_plan_days(trip, legs, shift_start_time=None, gazetteer=None, policy=None):
+    """
+    Streaming plan_trip(): yields {"type": "day", ...} with each day's summary (the
+    daily_summaries format) as soon as the simulation passes its midnight, then
+    {"type": "trip", ...} with the trip totals. Completed days are not kept, so memory
+    stays flat however long the trip is.
+    """
+    shift_start_time = shift_start_time or default_shift_start()
+    planner = start_planner(trip, shift_start_time, gazetteer, policy)
+    drive_hours = on_duty_hours = 0.0
+
+    def completed_days(finished=False):
+        nonlocal drive_hours, on_duty_hours
+        for day, entries in planner.pop_completed_days(finished):
+            summary = summarize_day(day, entries)
+            drive_hours += summary["drive_hours"]
+            on_duty_hours += summary["on_duty_hours"]
+            yield {"type": "day", **summary}
+
+    for _ in simulate(planner, trip, legs):
+        yield from completed_days()
+    yield from completed_days(finished=True)
+
+    yield {
+        "type": "trip",
+        "trip_id": trip.get('id', 'unknown'),
+        "start_time": shift_start_time.strftime(TIME_FORMAT),
+        "end_time": planner.current_time.strftime(TIME_FORMAT),
+        "total_miles": round(planner.total_miles, 2),
+        "total_drive_hours": round(drive_hours, 2),
+        "total_on_duty_hours": round(on_duty_hours, 2),
+        "total_days": planner.day_count,
+    }
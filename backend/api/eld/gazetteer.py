@@ -0,0 +1,98 @@
+"""
+Offline place names for log locations.
+
+A gazetteer CSV (name, region, country, latitude, longitude) is loaded on first
+use into a grid of 1-degree cells, so naming a point only scans the few cells
+around it. Points are named the way ELD records describe locations: the place
+itself when the truck is in town, otherwise the distance and direction from
+the nearest place, e.g. "12 mi NE of Harrisburg, PA".
+"""
+import csv
+import math
+from functools import lru_cache
+from pathlib import Path
+
+from ..geo import METERS_PER_MILE, haversine_meters
+
+BUNDLED_PLACES = Path(__file__).resolve().parent / "data" / "places.csv"
+
+# Closer than this the truck is considered to be in the place itself
+IN_TOWN_MILES = 2
+COMPASS_POINTS = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
+MILES_PER_DEGREE_LAT = 69.0
+
+
+@lru_cache(maxsize=None)
+def load_place_grid(path):
+    """
+    {(floor(lat), floor(lon)): [(lat, lon, label), ...]} for a gazetteer CSV, read once per process
+    """
+    grid = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            lat, lon = float(row["latitude"]), float(row["longitude"])
+            label = f"{row['name']}, {row['region']}" if row.get("region") else row["name"]
+            grid.setdefault((math.floor(lat), math.floor(lon)), []).append((lat, lon, label))
+    return grid
+
+
+def compass_direction(from_lat, from_lon, to_lat, to_lon):
+    """
+    8-point compass direction of the initial bearing from one point to another
+    """
+    phi1, phi2 = math.radians(from_lat), math.radians(to_lat)
+    d_lambda = math.radians(to_lon - from_lon)
+    y = math.sin(d_lambda) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(d_lambda)
+    bearing = math.degrees(math.atan2(y, x)) % 360
+    return COMPASS_POINTS[round(bearing / 45) % 8]
+
+
+class Gazetteer:
+    """
+    Nearest-place lookup over a gazetteer CSV. Picklable without its index, so it
+    can be handed to worker processes, which load the file on their first lookup.
+    """
+
+    def __init__(self, path=BUNDLED_PLACES, max_miles=100):
+        self.path = str(path)
+        self.max_miles = max_miles
+
+    def __getstate__(self):
+        return {"path": self.path, "max_miles": self.max_miles}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def nearest(self, lat, lon):
+        """
+        (distance in miles, place lat, place lon, label) of the nearest place within
+        max_miles, or None
+        """
+        grid = load_place_grid(self.path)
+        lat_cells = math.ceil(self.max_miles / MILES_PER_DEGREE_LAT)
+        # Longitude degrees shrink towards the poles, so widen the search accordingly
+        narrowest = math.cos(math.radians(min(abs(lat) + lat_cells, 89)))
+        lon_cells = math.ceil(self.max_miles / (MILES_PER_DEGREE_LAT * narrowest))
+
+        best = None
+        cell_lat, cell_lon = math.floor(lat), math.floor(lon)
+        for d_lat in range(-lat_cells, lat_cells + 1):
+            for d_lon in range(-lon_cells, lon_cells + 1):
+                for place_lat, place_lon, label in grid.get((cell_lat + d_lat, cell_lon + d_lon), ()):
+                    miles = haversine_meters(lat, lon, place_lat, place_lon) / METERS_PER_MILE
+                    if miles <= self.max_miles and (best is None or miles < best[0]):
+                        best = (miles, place_lat, place_lon, label)
+        return best
+
+    def name(self, lat, lon):
+        """
+        "Place, ST" or "12 mi NE of Place, ST", or None when no place is within max_miles
+        """
+        nearest = self.nearest(lat, lon)
+        if nearest is None:
+            return None
+        miles, place_lat, place_lon, label = nearest
+        if miles < IN_TOWN_MILES:
+            return label
+        return f"{miles:.0f} mi {compass_direction(place_lat, place_lon, lat, lon)} of {label}"
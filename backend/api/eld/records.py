@@ -0,0 +1,110 @@
+from datetime import date, datetime
+
+from .constants import STATUS_DRIVING, STATUS_ON_DUTY, TIME_FORMAT
+
+
+class Location:
+    __slots__ = ("lat", "lon", "name")
+
+    def __init__(self, lat, lon, name=None):
+        self.lat = lat
+        self.lon = lon
+        self.name = name if name is not None else f"Location at {lat:.4f}, {lon:.4f}"
+
+    def to_dict(self):
+        return {"name": self.name, "lat": self.lat, "lon": self.lon}
+
+
+class LogEntry:
+    __slots__ = ("status", "start_time", "end_time", "duration", "location", "miles", "notes")
+
+    def __init__(self, status, start_time, end_time, duration, location, miles, notes):
+        self.status = status
+        self.start_time = start_time  # Native datetimes, only formatted in to_dict
+        self.end_time = end_time
+        self.duration = duration  # Hours
+        self.location = location
+        self.miles = miles
+        self.notes = notes
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "start_time": self.start_time.strftime(TIME_FORMAT),
+            "end_time": self.end_time.strftime(TIME_FORMAT),
+            "duration": self.duration,
+            "location": self.location.to_dict(),
+            "miles": self.miles,
+            "notes": self.notes,
+        }
+
+
+def summarize_day(day, entries):
+    """
+    Serialize one day of log entries with its drive/on-duty/mile totals
+    """
+    return {
+        "date": day.isoformat(),
+        "drive_hours": round(sum(entry.duration for entry in entries if entry.status == STATUS_DRIVING), 2),
+        "on_duty_hours": round(sum(entry.duration for entry in entries if entry.status in (STATUS_DRIVING, STATUS_ON_DUTY)), 2),
+        "miles": round(sum(entry.miles for entry in entries), 2),
+        "logs": [entry.to_dict() for entry in entries],
+    }
+
+
+def rebase_plan_dates(data, first_day):
+    """
+    A to_dict() plan with every date and time moved by whole days so its first shift
+    falls on first_day; the input is returned as is when it already does
+    """
+    offset = first_day - datetime.strptime(data["start_time"], TIME_FORMAT).date()
+    if not offset:
+        return data
+
+    def shift(text):
+        return (datetime.strptime(text, TIME_FORMAT) + offset).strftime(TIME_FORMAT)
+
+    return {
+        **data,
+        "start_time": shift(data["start_time"]),
+        "end_time": shift(data["end_time"]),
+        "daily_summaries": [
+            {
+                **day,
+                "date": (date.fromisoformat(day["date"]) + offset).isoformat(),
+                "logs": [
+                    {**log, "start_time": shift(log["start_time"]), "end_time": shift(log["end_time"])}
+                    for log in day["logs"]
+                ],
+            }
+            for day in data["daily_summaries"]
+        ],
+    }
+
+
+class EldPlan:
+    __slots__ = ("trip_id", "start_time", "end_time", "total_miles", "total_days", "days")
+
+    def __init__(self, trip_id, start_time, end_time, total_miles, total_days, days):
+        self.trip_id = trip_id
+        self.start_time = start_time
+        self.end_time = end_time
+        self.total_miles = total_miles
+        self.total_days = total_days
+        self.days = days  # {date: [LogEntry, ...]} in chronological order
+
+    def to_dict(self):
+        """
+        Serialize to the trip_details response format
+        """
+        daily_summaries = [summarize_day(day, entries) for day, entries in self.days.items()]
+        return {
+            "trip_id": self.trip_id,
+            "start_time": self.start_time.strftime(TIME_FORMAT),
+            "end_time": self.end_time.strftime(TIME_FORMAT),
+            "total_miles": round(self.total_miles, 2),
+            "total_drive_hours": round(sum(day["drive_hours"] for day in daily_summaries), 2),
+            "total_on_duty_hours": round(sum(day["on_duty_hours"] for day in daily_summaries), 2),
+            "total_days": self.total_days,
+            "daily_summaries": daily_summaries,
+        }
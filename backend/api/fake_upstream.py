@@ -0,0 +1,192 @@
+"""
+Local stand-in for the OSRM and geocoding APIs.
+
+Serves OSRM-shaped /route/v1/<profile>/<coords> responses (straight-line legs
+split into evenly sized steps), /table/v1/<profile>/<coords> matrices and geocode.maps.co/Nominatim-shaped /reverse
+responses, with configurable latency and injected failures, so routing and
+geocoding can be exercised offline.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .geo import encode_polyline, haversine_meters
+
+
+def build_osrm_route(coordinates, steps_per_leg=10, speed_mps=25.0):
+    """
+    Build an OSRM route response for [(lon, lat), ...] waypoints
+    """
+    legs = []
+    for (start_lon, start_lat), (end_lon, end_lat) in zip(coordinates, coordinates[1:]):
+        leg_distance = haversine_meters(start_lat, start_lon, end_lat, end_lon)
+        steps = []
+        for index in range(steps_per_leg):
+            fraction = index / steps_per_leg
+            next_fraction = (index + 1) / steps_per_leg
+            steps.append({
+                "distance": leg_distance / steps_per_leg,
+                "duration": leg_distance / steps_per_leg / speed_mps,
+                "name": f"Fake Road {index + 1}",
+                "maneuver": {"location": [
+                    start_lon + fraction * (end_lon - start_lon),
+                    start_lat + fraction * (end_lat - start_lat),
+                ]},
+                "geometry": encode_polyline([
+                    (start_lat + fraction * (end_lat - start_lat), start_lon + fraction * (end_lon - start_lon)),
+                    (start_lat + next_fraction * (end_lat - start_lat), start_lon + next_fraction * (end_lon - start_lon)),
+                ]),
+            })
+        steps.append({
+            "distance": 0,
+            "duration": 0,
+            "name": "",
+            "maneuver": {"location": [end_lon, end_lat]},
+            "geometry": encode_polyline([(end_lat, end_lon), (end_lat, end_lon)]),
+        })
+        legs.append({
+            "distance": leg_distance,
+            "duration": leg_distance / speed_mps,
+            "steps": steps,
+        })
+
+    return {
+        "code": "Ok",
+        "routes": [{
+            "distance": sum(leg["distance"] for leg in legs),
+            "duration": sum(leg["duration"] for leg in legs),
+            "legs": legs,
+        }],
+        "waypoints": [{"location": list(coordinate)} for coordinate in coordinates],
+    }
+
+
+def build_osrm_table(coordinates, speed_mps=25.0):
+    """
+    Build an OSRM table response (durations and distances) for [(lon, lat), ...] points
+    """
+    distances = [
+        [haversine_meters(start_lat, start_lon, end_lat, end_lon) for end_lon, end_lat in coordinates]
+        for start_lon, start_lat in coordinates
+    ]
+    return {
+        "code": "Ok",
+        "durations": [[distance / speed_mps for distance in row] for row in distances],
+        "distances": distances,
+    }
+
+
+def build_reverse_geocode(lat, lon):
+    return {
+        "lat": str(lat),
+        "lon": str(lon),
+        "address": {"city": f"Fake City {lat:.2f},{lon:.2f}", "country": "Fakeland"},
+        "importance": 0.5,
+        "osm_type": "node",
+        "osm_id": 1,
+    }
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            fail = server.failures_remaining > 0
+            if fail:
+                server.failures_remaining -= 1
+
+        if server.latency:
+            time.sleep(server.latency)
+        if fail:
+            return self.send_json({"code": "Error"}, status=server.failure_status)
+
+        parsed = urlsplit(self.path)
+        if parsed.path.startswith(("/route/v1/", "/table/v1/")):
+            raw_coordinates = parsed.path.rsplit("/", 1)[-1]
+            coordinates = [tuple(float(value) for value in pair.split(",")) for pair in raw_coordinates.split(";")]
+            if parsed.path.startswith("/table/v1/"):
+                return self.send_json(build_osrm_table(coordinates))
+            return self.send_json(build_osrm_route(coordinates, server.steps_per_leg))
+        if parsed.path == "/reverse":
+            query = parse_qs(parsed.query)
+            return self.send_json(build_reverse_geocode(float(query["lat"][0]), float(query["lon"][0])))
+        return self.send_json({"error": "Not found"}, status=404)
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up on purpose (timeouts) are expected here
+        pass
+
+
+class FakeUpstream:
+    """
+    Threaded fake OSRM/geocode server, usable as a context manager:
+
+        with FakeUpstream(latency=0.05) as upstream:
+            with override_settings(OSRM_URL=upstream.url, GEOCODE_URL=upstream.url + "/reverse"):
+                ...
+    """
+
+    def __init__(self, latency=0.0, steps_per_leg=10, host="127.0.0.1", port=0):
+        self.server = FakeUpstreamServer((host, port), FakeUpstreamHandler)
+        self.server.lock = threading.Lock()
+        self.server.request_count = 0
+        self.server.failures_remaining = 0
+        self.server.failure_status = 503
+        self.server.latency = latency
+        self.server.steps_per_leg = steps_per_leg
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        return self.server.request_count
+
+    @property
+    def latency(self):
+        return self.server.latency
+
+    @latency.setter
+    def latency(self, value):
+        self.server.latency = value
+
+    def fail_next(self, count, status=503):
+        with self.server.lock:
+            self.server.failures_remaining = count
+            self.server.failure_status = status
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,218 @@
+import math
+from bisect import bisect_left
+from itertools import accumulate
+
+EARTH_RADIUS_METERS = 6371000
+METERS_PER_MILE = 1609.34
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance between two points in meters
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat, lon, precision):
+    """
+    Standard base-32 geohash of `precision` characters (7 ~ 150 m cells, 8 ~ 38 x 19 m)
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, starting with longitude
+        value, value_range = (lon, lon_range) if even else (lat, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            value_range[0] = mid
+        else:
+            bits = bits * 2
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+# Trips store their points at this precision (~5 m cells); nearby searches match on shorter prefixes
+TRIP_GEOHASH_PRECISION = 9
+
+
+def geohash_cell_size(precision):
+    """
+    (height, width) of a geohash cell in degrees
+    """
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def bounding_boxes(lat, lon, radius_meters):
+    """
+    One or two (min_lat, min_lon, max_lat, max_lon) boxes inside [-90, 90] x [-180, 180] that
+    together contain every point within radius_meters; a box crossing the antimeridian is
+    split in two, and a circle reaching a pole takes every longitude
+    """
+    lat = min(max(lat, -90.0), 90.0)
+    lon = (lon + 180) % 360 - 180
+    angle = radius_meters / EARTH_RADIUS_METERS
+    d_lat = math.degrees(angle)
+    min_lat, max_lat = max(lat - d_lat, -90.0), min(lat + d_lat, 90.0)
+
+    # Widest longitude span of the circle, which is larger than angle at higher latitudes
+    sin_ratio = math.sin(min(angle, math.pi / 2)) / max(math.cos(math.radians(lat)), 0.0)
+    if abs(lat) + d_lat >= 90 or sin_ratio >= 1:
+        return [(min_lat, -180.0, max_lat, 180.0)]
+    d_lon = math.degrees(math.asin(sin_ratio))
+
+    min_lon, max_lon = lon - d_lon, lon + d_lon
+    if min_lon < -180:
+        return [(min_lat, min_lon + 360, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+    if max_lon > 180:
+        return [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon - 360)]
+    return [(min_lat, min_lon, max_lat, max_lon)]
+
+
+def geohash_prefixes(box, max_cells=16):
+    """
+    Geohash prefixes whose cells together cover the bounding box, using the longest
+    prefix length that needs at most max_cells of them
+    """
+    min_lat, min_lon, max_lat, max_lon = box
+    for precision in range(TRIP_GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(precision)
+        rows = math.floor(max_lat / height) - math.floor(min_lat / height) + 1
+        columns = math.floor(max_lon / width) - math.floor(min_lon / width) + 1
+        if rows * columns <= max_cells:
+            break
+
+    lats = [min(min_lat + row * height, max_lat) for row in range(rows + 1)]
+    lons = [min(min_lon + column * width, max_lon) for column in range(columns + 1)]
+    return sorted({geohash_encode(lat, lon, precision) for lat in lats for lon in lons})
+
+
+def encode_polyline(points, precision=5):
+    """
+    Google encoded polyline of [(lat, lon), ...], the format OSRM uses for geometries
+    """
+    factor = 10 ** precision
+    chunks = []
+    previous_lat = previous_lon = 0
+    for lat, lon in points:
+        lat, lon = round(lat * factor), round(lon * factor)
+        for delta in (lat - previous_lat, lon - previous_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        previous_lat, previous_lon = lat, lon
+    return "".join(chunks)
+
+
+def decode_polyline(text, precision=5):
+    factor = 10 ** precision
+    points = []
+    index = lat = lon = 0
+    while index < len(text):
+        deltas = []
+        for _ in range(2):
+            shift = value = 0
+            while True:
+                byte = ord(text[index]) - 63
+                index += 1
+                value |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(value >> 1) if value & 1 else value >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append((lat / factor, lon / factor))
+    return points
+
+
+def simplify_polyline(points, tolerance):
+    """
+    Douglas-Peucker simplification of [(lat, lon), ...], keeping every point that lies more
+    than `tolerance` degrees off the simplified line. Iterative, so long routes can't hit the
+    recursion limit.
+    """
+    if len(points) < 3 or tolerance <= 0:
+        return list(points)
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    ranges = [(0, len(points) - 1)]
+    while ranges:
+        first, last = ranges.pop()
+        (start_lat, start_lon), (end_lat, end_lon) = points[first], points[last]
+        d_lat, d_lon = end_lat - start_lat, end_lon - start_lon
+        length = math.hypot(d_lat, d_lon)
+
+        farthest, farthest_distance = None, tolerance
+        for index in range(first + 1, last):
+            lat, lon = points[index]
+            if length:
+                distance = abs(d_lon * (lat - start_lat) - d_lat * (lon - start_lon)) / length
+            else:
+                distance = math.hypot(lat - start_lat, lon - start_lon)
+            if distance > farthest_distance:
+                farthest, farthest_distance = index, distance
+
+        if farthest is not None:
+            keep[farthest] = True
+            ranges.append((first, farthest))
+            ranges.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def cumulative_lengths(points):
+    """
+    Distance in meters from the first of [(lat, lon), ...] to each point along the line
+    """
+    return list(accumulate(
+        (haversine_meters(*start, *end) for start, end in zip(points, points[1:])),
+        initial=0.0,
+    ))
+
+
+def polyline_position(points, fraction, cumulative=None):
+    """
+    The point `fraction` (0 to 1) of the way along [(lat, lon), ...], found by binary search
+    over `cumulative`, a running total at each point such as the drive time so far, which
+    defaults to the distance (see cumulative_lengths())
+    """
+    if cumulative is None:
+        cumulative = cumulative_lengths(points)
+    target = fraction * cumulative[-1]
+    index = bisect_left(cumulative, target)
+    if index == 0:
+        return points[0]
+    if index >= len(points):
+        return points[-1]
+    (start_lat, start_lon), (end_lat, end_lon) = points[index - 1], points[index]
+    length = cumulative[index] - cumulative[index - 1]
+    part = (target - cumulative[index - 1]) / length if length else 0.0
+    return start_lat + part * (end_lat - start_lat), start_lon + part * (end_lon - start_lon)
+
+
+def zoom_tolerance(zoom):
+    """
+    Degrees covered by one 256 px web map tile pixel at `zoom` (at the equator)
+    """
+    return 360 / (256 * 2 ** zoom)
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .geo import geohash_encode
+from .models import GeocodeCacheEntry
+from .route_cache import record_cache_access
+
+GEOCODE_CACHE_COUNTER = "geocode"
+
+
+def geocode_cache_key(lat, lon):
+    """
+    Geohash cell of GEOCODE_CACHE_PRECISION characters, so nearby points share an entry
+    """
+    return geohash_encode(lat, lon, settings.GEOCODE_CACHE_PRECISION)
+
+
+def get_cached_geocode(key):
+    """
+    Return the cached reverse-geocode response for key, or None if it is missing or older than GEOCODE_CACHE_TTL
+    """
+    now = timezone.now()
+    entry = GeocodeCacheEntry.objects.filter(geohash=key).only("id", "data", "created_at").first()
+    if entry is None or entry.created_at < now - timedelta(seconds=settings.GEOCODE_CACHE_TTL):
+        record_cache_access(GEOCODE_CACHE_COUNTER, hit=False)
+        return None
+
+    GeocodeCacheEntry.objects.filter(id=entry.id).update(last_used_at=now)
+    record_cache_access(GEOCODE_CACHE_COUNTER, hit=True)
+    return entry.data
+
+
+def get_cached_geocodes(keys):
+    """
+    Bulk get_cached_geocode(): {key: response} for the keys with a fresh entry, in one query
+    """
+    now = timezone.now()
+    entries = GeocodeCacheEntry.objects.filter(
+        geohash__in=keys,
+        created_at__gte=now - timedelta(seconds=settings.GEOCODE_CACHE_TTL),
+    ).only("id", "geohash", "data")
+    found = {entry.geohash: entry for entry in entries}
+
+    if found:
+        GeocodeCacheEntry.objects.filter(id__in=[entry.id for entry in found.values()]).update(last_used_at=now)
+        record_cache_access(GEOCODE_CACHE_COUNTER, hit=True, count=len(found))
+    if len(keys) > len(found):
+        record_cache_access(GEOCODE_CACHE_COUNTER, hit=False, count=len(keys) - len(found))
+    return {key: entry.data for key, entry in found.items()}
+
+
+def store_geocode(key, data):
+    """
+    Store a reverse-geocode response and evict the least recently used entries above GEOCODE_CACHE_MAX_ENTRIES
+    """
+    now = timezone.now()
+    GeocodeCacheEntry.objects.update_or_create(
+        geohash=key,
+        defaults={"data": data, "created_at": now, "last_used_at": now},
+    )
+
+    max_entries = settings.GEOCODE_CACHE_MAX_ENTRIES
+    if GeocodeCacheEntry.objects.count() > max_entries:
+        stale_ids = list(
+            GeocodeCacheEntry.objects.order_by("-last_used_at").values_list("id", flat=True)[max_entries:]
+        )
+        GeocodeCacheEntry.objects.filter(id__in=stale_ids).delete()
@@ -0,0 +1,214 @@
+"""
+Reverse geocoding through geocode.maps.co with a Nominatim fallback, behind the
+geohash-bucketed geocode cache.
+"""
+import asyncio
+import copy
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import http_client
+from .geocode_cache import geocode_cache_key, get_cached_geocode, get_cached_geocodes, store_geocode
+
+# Engine placeholder for points without a known name (api.eld.records.Location)
+PLACEHOLDER_NAME_PREFIX = "Location at "
+
+
+class GeocodeCacheMiss(LookupError):
+    """Raised in GEOCODE_LOCAL_ONLY mode for points the cache has no entry for"""
+
+
+def geocode_params(lat, lon):
+    return {"lat": lat, "lon": lon, "api_key": settings.GEOCODE_API_KEY}
+
+
+def nominatim_params(lat, lon):
+    return {"format": "json", "lat": lat, "lon": lon, "zoom": 18, "addressdetails": 1}
+
+
+def location_name_from_address(data, lat, lon):
+    """
+    Pick the most specific place name from a reverse-geocode response
+    """
+    location_name = "Unknown location"
+    if data and "address" in data:
+        address = data.get("address", {})
+        location_name = (
+            address.get("city") or
+            address.get("village") or
+            address.get("town") or
+            address.get("hamlet") or
+            address.get("suburb") or
+            address.get("neighbourhood") or
+            address.get("county") or
+            f"Location at {lat:.4f}, {lon:.4f}"
+        )
+    return location_name
+
+
+_upstream_slots = None
+_upstream_slots_lock = threading.Lock()
+
+
+def upstream_slots():
+    """
+    Process-wide semaphore capping concurrent upstream lookups at GEOCODE_MAX_CONCURRENCY
+    """
+    global _upstream_slots
+    with _upstream_slots_lock:
+        size = settings.GEOCODE_MAX_CONCURRENCY
+        if _upstream_slots is None or _upstream_slots[0] != size:
+            _upstream_slots = (size, threading.BoundedSemaphore(size))
+        return _upstream_slots[1]
+
+
+_async_upstream_slots = weakref.WeakKeyDictionary()
+
+
+def async_upstream_slots():
+    """
+    upstream_slots() for coroutines: an asyncio.Semaphore of the same size for the
+    running event loop, since asyncio semaphores can't be shared between loops
+    """
+    loop = asyncio.get_running_loop()
+    size = settings.GEOCODE_MAX_CONCURRENCY
+    slots = _async_upstream_slots.get(loop)
+    if slots is None or slots[0] != size:
+        slots = _async_upstream_slots[loop] = (size, asyncio.Semaphore(size))
+    return slots[1]
+
+
+def fetch_reverse_geocode(lat, lon):
+    with upstream_slots():
+        return request_reverse_geocode(lat, lon)
+
+
+def request_reverse_geocode(lat, lon):
+    try:
+        response = http_client.get(settings.GEOCODE_URL, params=geocode_params(lat, lon))
+        response.raise_for_status()
+    except requests.exceptions.RequestException:
+        # Fall back to Nominatim when geocode.maps.co is down or out of quota
+        response = http_client.get(settings.NOMINATIM_URL, params=nominatim_params(lat, lon))
+        response.raise_for_status()
+    return response.json()
+
+
+async def afetch_reverse_geocode(lat, lon):
+    async with async_upstream_slots():
+        return await arequest_reverse_geocode(lat, lon)
+
+
+async def arequest_reverse_geocode(lat, lon):
+    try:
+        response = await http_client.aget(settings.GEOCODE_URL, params=geocode_params(lat, lon))
+        if response.is_error:
+            raise requests.exceptions.HTTPError(f"Geocode request failed with status code {response.status_code}")
+    except requests.exceptions.RequestException:
+        # Fall back to Nominatim when geocode.maps.co is down or out of quota
+        response = await http_client.aget(settings.NOMINATIM_URL, params=nominatim_params(lat, lon))
+        if response.is_error:
+            raise requests.exceptions.HTTPError(f"Nominatim request failed with status code {response.status_code}")
+    return response.json()
+
+
+def reverse_geocode(lat, lon):
+    """
+    Raw reverse-geocode response for a point, from the cache when its cell was looked up before.
+    Raises requests.exceptions.RequestException when both upstreams fail, ValueError on
+    invalid JSON and GeocodeCacheMiss in GEOCODE_LOCAL_ONLY mode.
+    """
+    key = geocode_cache_key(lat, lon)
+    data = get_cached_geocode(key)
+    if data is not None:
+        return data
+    if settings.GEOCODE_LOCAL_ONLY:
+        raise GeocodeCacheMiss(f"No cached reverse geocode for {lat:.4f}, {lon:.4f}")
+
+    data = fetch_reverse_geocode(lat, lon)
+    store_geocode(key, data)
+    return data
+
+
+async def areverse_geocode(lat, lon):
+    """
+    Async reverse_geocode()
+    """
+    key = geocode_cache_key(lat, lon)
+    data = await sync_to_async(get_cached_geocode)(key)
+    if data is not None:
+        return data
+    if settings.GEOCODE_LOCAL_ONLY:
+        raise GeocodeCacheMiss(f"No cached reverse geocode for {lat:.4f}, {lon:.4f}")
+
+    data = await afetch_reverse_geocode(lat, lon)
+    await sync_to_async(store_geocode)(key, data)
+    return data
+
+
+def reverse_geocode_many(points):
+    """
+    reverse_geocode() for a list of (lat, lon) points, returning one response (or the
+    exception raised for it) per point. Points sharing a cache cell are looked up once,
+    cached cells come from a single query and the rest are fetched concurrently,
+    bounded by upstream_slots().
+    """
+    keys = [geocode_cache_key(lat, lon) for lat, lon in points]
+    unique = {}
+    for key, point in zip(keys, points):
+        unique.setdefault(key, point)
+
+    results = get_cached_geocodes(list(unique))
+    missing = {key: point for key, point in unique.items() if key not in results}
+    if missing and settings.GEOCODE_LOCAL_ONLY:
+        for key, (lat, lon) in missing.items():
+            results[key] = GeocodeCacheMiss(f"No cached reverse geocode for {lat:.4f}, {lon:.4f}")
+    elif missing:
+        with ThreadPoolExecutor(max_workers=min(len(missing), settings.GEOCODE_MAX_CONCURRENCY)) as pool:
+            futures = {key: pool.submit(fetch_reverse_geocode, lat, lon) for key, (lat, lon) in missing.items()}
+        for key, future in futures.items():
+            try:
+                data = future.result()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                results[key] = e
+                continue
+            # Stored from this thread, the workers never touch the database
+            store_geocode(key, data)
+            results[key] = data
+
+    return [results[key] for key in keys]
+
+
+def resolve_log_location_names(eld_data):
+    """
+    Copy of trip_details output with placeholder log locations replaced by reverse-geocoded
+    names; locations that can't be resolved keep their placeholder. Like the bulk endpoint,
+    at most settings.GEOCODE_BATCH_MAX_POINTS cache cells are looked up and locations in
+    later cells keep their placeholder too.
+    """
+    eld_data = copy.deepcopy(eld_data)
+    cells = set()
+    locations = []
+    for day in eld_data['daily_summaries']:
+        for log in day['logs']:
+            location = log['location']
+            if not location['name'].startswith(PLACEHOLDER_NAME_PREFIX):
+                continue
+            key = geocode_cache_key(location['lat'], location['lon'])
+            if key not in cells and len(cells) < settings.GEOCODE_BATCH_MAX_POINTS:
+                cells.add(key)
+            if key in cells:
+                locations.append(location)
+    if not locations:
+        return eld_data
+
+    responses = reverse_geocode_many([(location['lat'], location['lon']) for location in locations])
+    for location, data in zip(locations, responses):
+        if not isinstance(data, Exception):
+            location['name'] = location_name_from_address(data, location['lat'], location['lon'])
+    return eld_data
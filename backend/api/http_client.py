@@ -0,0 +1,202 @@
+"""
+Shared HTTP client for outbound calls (OSRM, geocoding).
+
+Keeps one pooled requests.Session per host, applies connect/read timeouts,
+retries transient failures with jittered exponential backoff and stops
+calling a host for a while once it keeps failing (circuit breaker).
+aget() does the same for async views on a pooled httpx.AsyncClient, sharing
+the circuit breakers with get().
+"""
+import asyncio
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .instrumentation import span
+
+# Upstream statuses worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+USER_AGENT = "RouteLog/1.0"
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised without touching the network while a host's circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls and lets a single
+    trial call through once `reset_timeout` seconds have passed
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Half-open: let this call through, a failure re-opens the circuit
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+_sessions = {}
+_breakers = {}
+# AsyncClients are bound to the event loop they were first used on
+_async_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def get_session(host):
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.HTTP_POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _sessions[host] = session
+        return session
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.HTTP_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_keepalive_connections=settings.HTTP_POOL_MAXSIZE),
+                headers={"User-Agent": USER_AGENT},
+            )
+            _async_clients[loop] = client
+        return client
+
+
+def get_breaker(host):
+    with _lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(settings.HTTP_CIRCUIT_FAILURES, settings.HTTP_CIRCUIT_RESET)
+            _breakers[host] = breaker
+        return breaker
+
+
+def reset_clients():
+    """
+    Close pooled sessions and forget circuit state (used by tests)
+    """
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        _async_clients.clear()
+        _breakers.clear()
+
+
+def backoff_delay(attempt):
+    """
+    Full-jitter exponential backoff
+    """
+    return random.uniform(0, settings.HTTP_BACKOFF * (2 ** attempt))
+
+
+def get(url, params=None, **kwargs):
+    """
+    GET `url` through the pooled session for its host.
+    Returns the final response (which may still be an error status) or raises
+    requests.exceptions.RequestException after the retries are used up.
+    """
+    host = urlsplit(url).netloc
+    breaker = get_breaker(host)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit open for {host}")
+
+    with span("http", host):
+        return send_with_retries(get_session(host), breaker, url, params, **kwargs)
+
+
+def send_with_retries(session, breaker, url, params=None, **kwargs):
+    timeout = (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT)
+    retries = settings.HTTP_MAX_RETRIES
+
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, params=params, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries:
+                breaker.record_failure()
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+            if attempt == retries:
+                breaker.record_failure()
+                return response
+            response.close()
+        time.sleep(backoff_delay(attempt))
+
+
+async def aget(url, params=None, **kwargs):
+    """
+    Async get(): same retries and circuit breaker, on the event loop's pooled
+    httpx.AsyncClient. Transport failures are raised as the requests exceptions
+    get() would raise, so callers can handle both paths alike.
+    """
+    host = urlsplit(url).netloc
+    breaker = get_breaker(host)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit open for {host}")
+
+    with span("http", host):
+        return await asend_with_retries(get_async_client(), breaker, url, params, **kwargs)
+
+
+async def asend_with_retries(client, breaker, url, params=None, **kwargs):
+    retries = settings.HTTP_MAX_RETRIES
+
+    for attempt in range(retries + 1):
+        try:
+            response = await client.get(url, params=params, **kwargs)
+        except httpx.TransportError as e:
+            if attempt == retries:
+                breaker.record_failure()
+                if isinstance(e, httpx.TimeoutException):
+                    raise requests.exceptions.Timeout(str(e)) from e
+                raise requests.exceptions.ConnectionError(str(e)) from e
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+            if attempt == retries:
+                breaker.record_failure()
+                return response
+        await asyncio.sleep(backoff_delay(attempt))
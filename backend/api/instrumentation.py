@@ -0,0 +1,185 @@
+"""
+Per-request performance timers.
+
+span() times a block into the current request's RequestTimings (a context
+variable, so it follows the request into sync_to_async threads) and into the
+process-wide Prometheus counters served at /metrics. ServerTimingMiddleware
+starts the per-request timings and reports them in a Server-Timing header:
+DB queries (via a connection execute wrapper), outbound HTTP per host, routing,
+Trip queries and engine CPU time. Work on worker pools outside the request's
+context only shows up in /metrics.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+METRIC_PREFIX = "routelog"
+
+METRIC_HELP = {
+    "requests_total": ("counter", "Requests served, by view and status"),
+    "request_seconds_total": ("counter", "Wall time spent serving requests, by view"),
+    "span_seconds_total": ("counter", "Time spent in instrumented spans (CPU time for engine)"),
+    "span_calls_total": ("counter", "Instrumented span calls"),
+}
+
+_current = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """
+    Seconds and call counts per (span, target) for one request
+    """
+
+    def __init__(self):
+        self.spans = defaultdict(lambda: [0.0, 0])
+        self._lock = threading.Lock()
+
+    def add(self, name, target, seconds):
+        with self._lock:
+            entry = self.spans[(name, target)]
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self, total):
+        """
+        Server-Timing header value, durations in milliseconds
+        """
+        with self._lock:
+            spans = sorted(self.spans.items())
+        parts = []
+        for (name, target), (seconds, count) in spans:
+            desc = target or (f"{count} queries" if name == "db" else f"{count} calls")
+            parts.append(f'{name};dur={seconds * 1000:.1f};desc="{desc}"')
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+class Metrics:
+    """
+    Process-wide counters rendered in the Prometheus text format
+    """
+
+    def __init__(self):
+        self.values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, metric, value=1, **labels):
+        with self._lock:
+            self.values[(metric, tuple(sorted(labels.items())))] += value
+
+    def get(self, metric, **labels):
+        with self._lock:
+            return self.values.get((metric, tuple(sorted(labels.items()))), 0)
+
+    def reset(self):
+        with self._lock:
+            self.values.clear()
+
+    def render(self):
+        with self._lock:
+            values = sorted(self.values.items())
+        lines = []
+        for metric, (metric_type, help_text) in METRIC_HELP.items():
+            name = f"{METRIC_PREFIX}_{metric}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for (value_metric, labels), value in values:
+                if value_metric != metric:
+                    continue
+                label_text = ",".join(f'{key}="{escape_label(value)}"' for key, value in labels)
+                lines.append(f"{name}{{{label_text}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
+
+
+def record_span(name, seconds, target=""):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, target, seconds)
+    metrics.inc("span_seconds_total", seconds, span=name, target=target)
+    metrics.inc("span_calls_total", span=name, target=target)
+
+
+@contextmanager
+def span(name, target="", cpu=False):
+    """
+    Time the block as `name` (per `target`, e.g. an upstream host); cpu=True
+    records this thread's CPU time instead of wall time
+    """
+    clock = time.thread_time if cpu else time.perf_counter
+    started = clock()
+    try:
+        yield
+    finally:
+        record_span(name, clock() - started, target)
+
+
+def record_query(execute, sql, params, many, context):
+    with span("db"):
+        return execute(sql, params, many, context)
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """
+    connection_created handler: time every query run on the new connection
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class ServerTimingMiddleware:
+    """
+    Collect span timings for each request, count it in /metrics and, with
+    settings.SERVER_TIMING_HEADER, add a Server-Timing header. Streaming responses are
+    only timed until the view returns them, not while their content is sent.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    def finish(self, request, response, timings, total):
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        metrics.inc("requests_total", view=view, status=response.status_code)
+        metrics.inc("request_seconds_total", total, view=view)
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = timings.server_timing(total)
+        return response
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.19 on 2026-10-17 22:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_cachecounter_routecacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripEldLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('engine_version', models.PositiveIntegerField()),
+                ('data', models.JSONField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='eld_log', to='api.trip')),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+def clear_route_cache(apps, schema_editor):
+    # Cached routes are now stored as {"legs": [...]}, drop entries in the old single-route format
+    apps.get_model('api', 'RouteCacheEntry').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_tripeldlog'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_route_cache, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.19 on 2026-10-17 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_geocodecacheentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='trip_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.19 on 2026-10-17 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_trip_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='current_geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='dropoff_geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='pickup_geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12, null=True),
+        ),
+    ]
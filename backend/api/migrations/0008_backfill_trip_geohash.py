@@ -0,0 +1,33 @@
+from django.db import migrations
+
+from api.geo import TRIP_GEOHASH_PRECISION, geohash_encode
+
+POINTS = ['current', 'pickup', 'dropoff']
+
+
+def backfill_trip_geohashes(apps, schema_editor):
+    Trip = apps.get_model('api', 'Trip')
+    batch = []
+    for trip in Trip.objects.only('id', *(f'{point}_{axis}' for point in POINTS for axis in ('latitude', 'longitude'))).iterator(chunk_size=1000):
+        for point in POINTS:
+            lat = getattr(trip, f'{point}_latitude')
+            lon = getattr(trip, f'{point}_longitude')
+            if lat is not None and lon is not None:
+                setattr(trip, f'{point}_geohash', geohash_encode(lat, lon, TRIP_GEOHASH_PRECISION))
+        batch.append(trip)
+        if len(batch) == 1000:
+            Trip.objects.bulk_update(batch, [f'{point}_geohash' for point in POINTS])
+            batch = []
+    if batch:
+        Trip.objects.bulk_update(batch, [f'{point}_geohash' for point in POINTS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_trip_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_trip_geohashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def clear_route_cache(apps, schema_editor):
+    # Cached legs now carry their encoded road geometry, drop entries routed without it
+    apps.get_model('api', 'RouteCacheEntry').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_backfill_trip_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripRouteGeometry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('levels', models.JSONField()),
+                ('etag', models.CharField(max_length=40)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='route_geometry', to='api.trip')),
+            ],
+        ),
+        migrations.RunPython(clear_route_cache, migrations.RunPython.noop),
+    ]
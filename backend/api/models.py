@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
+from .geo import TRIP_GEOHASH_PRECISION, geohash_encode
+
 
 class CustomUser(AbstractUser):
     home_address = models.CharField(max_length=255, blank=True, null=True)  # Address field
@@ -27,11 +29,120 @@ class Trip(models.Model):
     dropoff_latitude = models.FloatField(null=True, blank=True)
     dropoff_longitude = models.FloatField(null=True, blank=True)
 
+    # Geohashes of the three points (TRIP_GEOHASH_PRECISION), kept in sync by save() for nearby searches
+    current_geohash = models.CharField(max_length=12, null=True, blank=True, db_index=True)
+    pickup_geohash = models.CharField(max_length=12, null=True, blank=True, db_index=True)
+    dropoff_geohash = models.CharField(max_length=12, null=True, blank=True, db_index=True)
+
     current_cycle_used = models.FloatField(help_text="Hours already used in the current driving cycle")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     user = models.ForeignKey('api.CustomUser', on_delete=models.CASCADE, default=1)
 
+    # Fields that feed the ELD engine; changing any of them invalidates stored logs
+    ELD_INPUT_FIELDS = [
+        'current_location', 'current_latitude', 'current_longitude',
+        'pickup_location', 'pickup_latitude', 'pickup_longitude',
+        'dropoff_location', 'dropoff_latitude', 'dropoff_longitude',
+        'current_cycle_used',
+    ]
+
+    class Meta:
+        indexes = [
+            # Owner-scoped trip listing, newest first (TripCursorPagination)
+            models.Index(fields=['user', '-created_at', '-id'], name='trip_user_created_idx'),
+        ]
+
+    # Trip points that can be searched by proximity
+    POINTS = ['current', 'pickup', 'dropoff']
+
+    def save(self, *args, **kwargs):
+        for point in self.POINTS:
+            lat = getattr(self, f'{point}_latitude')
+            lon = getattr(self, f'{point}_longitude')
+            geohash = geohash_encode(lat, lon, TRIP_GEOHASH_PRECISION) if lat is not None and lon is not None else None
+            setattr(self, f'{point}_geohash', geohash)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *(f'{point}_geohash' for point in self.POINTS)}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Trip from {self.current_location} to {self.dropoff_location}"
+
+
+class TripStop(models.Model):
+    PICKUP = 'pickup'
+    DROPOFF = 'dropoff'
+    KINDS = [(PICKUP, 'Pickup'), (DROPOFF, 'Dropoff')]
+
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='stops')
+    position = models.PositiveIntegerField()  # Order after the trip's current location, from 0
+    kind = models.CharField(max_length=10, choices=KINDS)
+    location = models.CharField(max_length=255)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    # Fields that feed the ELD engine, as in Trip.ELD_INPUT_FIELDS
+    ELD_INPUT_FIELDS = ['kind', 'location', 'latitude', 'longitude']
+
+    class Meta:
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['trip', 'position'], name='trip_stop_position_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.position + 1} of trip {self.trip_id}: {self.location}"
+
+
+class RouteCacheEntry(models.Model):
+    key = models.CharField(max_length=255, unique=True)  # Snapped waypoints + routing profile
+    profile = models.CharField(max_length=32, default="driving")
+    route = models.JSONField()  # Structured route as returned by get_route
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)  # Drives LRU eviction
+
+    def __str__(self):
+        return self.key
+
+
+class GeocodeCacheEntry(models.Model):
+    geohash = models.CharField(max_length=12, unique=True)  # Cell at GEOCODE_CACHE_PRECISION
+    data = models.JSONField()  # Raw reverse-geocode response for the first point looked up in the cell
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)  # Drives LRU eviction
+
+    def __str__(self):
+        return self.geohash
+
+
+class CacheCounter(models.Model):
+    name = models.CharField(max_length=64, unique=True)
+    hits = models.BigIntegerField(default=0)
+    misses = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.hits} hits / {self.misses} misses"
+
+
+class TripEldLog(models.Model):
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, related_name='eld_log')
+    engine_version = models.PositiveIntegerField()  # ELD_ENGINE_VERSION the logs were computed with
+    data = models.JSONField()  # calculate_eld_logs output served by trip_details
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"ELD logs for trip {self.trip_id} (v{self.engine_version})"
+
+
+class TripRouteGeometry(models.Model):
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, related_name='route_geometry')
+    levels = models.JSONField()  # {"full": polyline, "<zoom>": simplified polyline, ...}
+    etag = models.CharField(max_length=40)  # Digest of the full polyline
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Route geometry for trip {self.trip_id}"
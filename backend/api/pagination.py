@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TripCursorPagination(CursorPagination):
+    """
+    Newest trips first. Cursors seek on (user, created_at) through Trip's index,
+    so every page costs the same however deep the history goes.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,286 @@
+"""
+Glue between Trip rows, the routing layer and the ELD engine.
+
+Serves single trips for trip_details and whole fleets for the batch endpoint,
+which deduplicates shared routes, fetches them on a thread pool, plans on a
+process pool and yields NDJSON lines as each trip completes. What-if scenarios
+route a trip once and plan it under each parameter set.
+"""
+import json
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.models import prefetch_related_objects
+
+from .eld import (
+    ENGINE_VERSION as ELD_ENGINE_VERSION, Gazetteer, HosPolicy, iter_plan_days, plan_trip_dict, plan_trip_summary,
+    rebase_plan_dates,
+)
+from .eld.gazetteer import BUNDLED_PLACES
+from .instrumentation import span
+from .models import TripEldLog
+from .routing import aget_trip_legs, get_trip_legs, trip_waypoints
+
+
+def trip_to_eld_input(trip):
+    """
+    Convert a Trip model to the dictionary plan_trip expects
+    """
+    trip_data = {
+        "id": trip.id,
+        "current_latitude": float(trip.current_latitude),
+        "current_longitude": float(trip.current_longitude),
+        "current_location": trip.current_location,
+        "pickup_latitude": float(trip.pickup_latitude),
+        "pickup_longitude": float(trip.pickup_longitude),
+        "pickup_location": trip.pickup_location,
+        "dropoff_latitude": float(trip.dropoff_latitude),
+        "dropoff_longitude": float(trip.dropoff_longitude),
+        "dropoff_location": trip.dropoff_location,
+        "accumulated_weekly_hours": float(trip.current_cycle_used)
+    }
+
+    # Multi-stop trips list every stop; the pickup/dropoff fields above then only mirror the first and last
+    stops = [
+        {"kind": stop.kind, "latitude": stop.latitude, "longitude": stop.longitude, "location": stop.location}
+        for stop in trip.stops.all()
+    ]
+    if stops:
+        trip_data["stops"] = stops
+    return trip_data
+
+
+def get_gazetteer():
+    """
+    Gazetteer configured by settings.ELD_GAZETTEER, or None when offline place names are off
+    """
+    if not settings.ELD_GAZETTEER:
+        return None
+    path = BUNDLED_PLACES if settings.ELD_GAZETTEER == "bundled" else settings.ELD_GAZETTEER
+    return Gazetteer(path, max_miles=settings.ELD_GAZETTEER_MAX_MILES)
+
+
+def calculate_eld_logs(trip):
+    """
+    Calculate ELD logs for a trip with proper location tracking
+    """
+    return plan_eld_logs(trip, get_trip_legs(trip))
+
+
+def plan_eld_logs(trip, legs):
+    """
+    Run the engine on fetched legs, recording its CPU time as the "engine" span
+    """
+    with span("engine", cpu=True):
+        return plan_trip_dict(trip, legs, gazetteer=get_gazetteer())
+
+
+async def acalculate_eld_logs(trip):
+    """
+    Async calculate_eld_logs(): awaits the route fetches and plans off the event loop
+    """
+    legs = await aget_trip_legs(trip)
+    return await sync_to_async(plan_eld_logs, thread_sensitive=False)(trip, legs)
+
+
+def has_route_errors(eld_data):
+    """
+    Check whether any log entry records a failed route fetch
+    """
+    return any(
+        log['notes'].startswith("Error fetching route")
+        for day in eld_data['daily_summaries']
+        for log in day['logs']
+    )
+
+
+def get_stored_eld_logs(trip):
+    """
+    Return the trip's materialized ELD logs if they were built by the current engine.
+    Plans start on the day they are generated, so stored ones are moved to start today.
+    """
+    try:
+        stored = trip.eld_log
+    except TripEldLog.DoesNotExist:
+        return None
+    if stored.engine_version != ELD_ENGINE_VERSION:
+        return None
+    return rebase_plan_dates(stored.data, datetime.now().date())
+
+
+def store_eld_logs(trip, eld_data):
+    # Don't persist logs built around a failed route fetch, the next view should retry
+    if not has_route_errors(eld_data):
+        TripEldLog.objects.update_or_create(
+            trip=trip,
+            defaults={"engine_version": ELD_ENGINE_VERSION, "data": eld_data}
+        )
+
+
+def fetch_trip_legs(trip_data):
+    """
+    get_trip_legs() for a worker thread, which must give back its own DB connection
+    """
+    try:
+        return get_trip_legs(trip_data)
+    finally:
+        connections.close_all()
+
+
+def ndjson_line(data):
+    return json.dumps(data) + "\n"
+
+
+def stream_eld_logs(trip):
+    """
+    Yield a trip's ELD logs as NDJSON: {"type": "day", ...} per day as soon as the engine
+    completes it, then {"type": "trip", ...} with the totals. Stored logs are replayed in
+    the same format. Fresh logs are stored afterwards unless the trip runs longer than
+    ELD_STREAM_STORE_MAX_DAYS, which would mean buffering every day until the end.
+    """
+    try:
+        stored = get_stored_eld_logs(trip)
+        if stored is not None:
+            for summary in stored['daily_summaries']:
+                yield ndjson_line({"type": "day", **summary})
+            yield ndjson_line({"type": "trip", **{key: value for key, value in stored.items() if key != 'daily_summaries'}})
+            return
+
+        # Stops are only needed to recompute, so stored logs stay at one query
+        prefetch_related_objects([trip], 'stops')
+        trip_data = trip_to_eld_input(trip)
+        daily_summaries = []
+        for item in iter_plan_days(trip_data, get_trip_legs(trip_data), gazetteer=get_gazetteer()):
+            yield ndjson_line(item)
+            data = {key: value for key, value in item.items() if key != "type"}
+            if item["type"] == "day":
+                if daily_summaries is not None:
+                    daily_summaries.append(data)
+                    if len(daily_summaries) > settings.ELD_STREAM_STORE_MAX_DAYS:
+                        daily_summaries = None
+            elif daily_summaries is not None:
+                store_eld_logs(trip, {**data, "daily_summaries": daily_summaries})
+    except Exception as e:
+        # The response has already started, so report the failure in-band
+        yield ndjson_line({"type": "error", "error": str(e)})
+
+
+def stream_trip_plans(trips, missing_ids=()):
+    """
+    Yield one NDJSON line per trip (its ELD logs, or {"trip_id", "error"}) in completion order.
+    Trips with stored logs come first; the rest are grouped by waypoints so each distinct
+    route is fetched once, with up to settings.BATCH_ROUTE_WORKERS fetches in flight, and
+    planned on settings.BATCH_PLAN_WORKERS processes (0 plans inline).
+    """
+    for trip_id in sorted(missing_ids):
+        yield ndjson_line({"trip_id": trip_id, "error": "Trip not found"})
+
+    groups = {}
+    for trip in trips:
+        stored = get_stored_eld_logs(trip)
+        if stored is not None:
+            yield ndjson_line(stored)
+            continue
+        trip_data = trip_to_eld_input(trip)
+        groups.setdefault(trip_waypoints(trip_data), []).append((trip, trip_data))
+    if not groups:
+        return
+
+    plan_workers = settings.BATCH_PLAN_WORKERS
+    gazetteer = get_gazetteer()
+    plan_pool = None
+    route_pool = ThreadPoolExecutor(max_workers=min(settings.BATCH_ROUTE_WORKERS, len(groups)))
+    try:
+        pending = {
+            route_pool.submit(fetch_trip_legs, members[0][1]): members
+            for members in groups.values()
+        }
+        plans = {}
+        while pending or plans:
+            done, _ = wait(list(pending) + list(plans), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in pending:
+                    members = pending.pop(future)
+                    try:
+                        legs = future.result()
+                    except Exception as e:
+                        for trip, _ in members:
+                            yield ndjson_line({"trip_id": trip.id, "error": str(e)})
+                        continue
+                    for trip, trip_data in members:
+                        if plan_workers:
+                            if plan_pool is None:
+                                plan_pool = ProcessPoolExecutor(
+                                    max_workers=plan_workers,
+                                    mp_context=multiprocessing.get_context("spawn"),
+                                )
+                            plans[plan_pool.submit(plan_trip_dict, trip_data, legs, None, gazetteer)] = trip
+                        else:
+                            try:
+                                eld_data = plan_trip_dict(trip_data, legs, gazetteer=gazetteer)
+                            except Exception as e:
+                                yield ndjson_line({"trip_id": trip.id, "error": str(e)})
+                                continue
+                            store_eld_logs(trip, eld_data)
+                            yield ndjson_line(eld_data)
+                else:
+                    trip = plans.pop(future)
+                    try:
+                        eld_data = future.result()
+                    except Exception as e:
+                        yield ndjson_line({"trip_id": trip.id, "error": str(e)})
+                        continue
+                    store_eld_logs(trip, eld_data)
+                    yield ndjson_line(eld_data)
+    finally:
+        route_pool.shutdown(wait=False, cancel_futures=True)
+        if plan_pool is not None:
+            plan_pool.shutdown(wait=False, cancel_futures=True)
+
+
+POLICY_FIELDS = ("drive_hours_before_break", "break_minutes", "fuel_stop_miles", "fuel_stop_minutes")
+
+
+def scenario_plan_args(trip_data, legs, scenario):
+    """
+    plan_trip_summary() arguments for one scenario: its first shift starts today at
+    start_time and current_cycle_used replaces the trip's; omitted fields keep the defaults
+    """
+    start_time = scenario.get("start_time")
+    shift_start_time = datetime.combine(datetime.now().date(), start_time) if start_time else None
+    if scenario.get("current_cycle_used") is not None:
+        trip_data = {**trip_data, "accumulated_weekly_hours": float(scenario["current_cycle_used"])}
+    policy = HosPolicy(**{field: scenario[field] for field in POLICY_FIELDS if field in scenario})
+    return trip_data, legs, shift_start_time, None, policy
+
+
+def plan_scenarios(trip, scenarios):
+    """
+    Route the trip once and plan it under every scenario (validated ScenarioSerializer data).
+    Returns one plan_trip_summary() row per scenario, in order; raises ValueError when a leg
+    can't be routed. Plans run inline: one takes about a millisecond, less than sending the
+    legs to a worker process would.
+    """
+    trip_data = trip_to_eld_input(trip)
+    legs = get_trip_legs(trip_data)
+    for leg in legs:
+        if isinstance(leg, ValueError):
+            raise leg
+
+    jobs = [scenario_plan_args(trip_data, legs, scenario) for scenario in scenarios]
+    with span("engine", cpu=True):
+        summaries = [plan_trip_summary(*job) for job in jobs]
+
+    rows = []
+    for index, (scenario, summary) in enumerate(zip(scenarios, summaries)):
+        del summary["trip_id"]
+        rows.append({
+            "name": scenario.get("name") or f"Scenario {index + 1}",
+            "current_cycle_used": jobs[index][0]["accumulated_weekly_hours"],
+            **summary,
+        })
+    return rows
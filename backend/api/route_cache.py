@@ -0,0 +1,75 @@
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CacheCounter, RouteCacheEntry
+
+ROUTE_CACHE_COUNTER = "route"
+
+logger = logging.getLogger(__name__)
+
+
+def route_cache_key(points, profile="driving"):
+    """
+    Build a cache key from a list of (lat, lon) pairs snapped to ROUTE_CACHE_PRECISION decimals.
+    The points are hashed so the key fits RouteCacheEntry.key however many there are.
+    """
+    precision = settings.ROUTE_CACHE_PRECISION
+    coords = ";".join(f"{lat:.{precision}f},{lon:.{precision}f}" for lat, lon in points)
+    return f"{profile}:{hashlib.sha256(coords.encode()).hexdigest()}"
+
+
+def record_cache_access(name, hit, count=1):
+    """
+    Increment the hit or miss counter for the named cache
+    """
+    field = "hits" if hit else "misses"
+    updated = CacheCounter.objects.filter(name=name).update(**{field: F(field) + count})
+    if not updated:
+        try:
+            CacheCounter.objects.create(name=name, **{field: count})
+        except IntegrityError:
+            CacheCounter.objects.filter(name=name).update(**{field: F(field) + count})
+
+
+def get_cached_route(key):
+    """
+    Return the cached route for key, or None if it is missing or older than ROUTE_CACHE_TTL
+    """
+    now = timezone.now()
+    entry = RouteCacheEntry.objects.filter(key=key).only("id", "route", "created_at").first()
+    if entry is None or entry.created_at < now - timedelta(seconds=settings.ROUTE_CACHE_TTL):
+        record_cache_access(ROUTE_CACHE_COUNTER, hit=False)
+        return None
+
+    RouteCacheEntry.objects.filter(id=entry.id).update(last_used_at=now)
+    record_cache_access(ROUTE_CACHE_COUNTER, hit=True)
+    return entry.route
+
+
+def store_route(key, route, profile="driving"):
+    """
+    Store a route and evict the least recently used entries above ROUTE_CACHE_MAX_ENTRIES.
+    A failed write is logged and skipped; the caller already has its route.
+    """
+    now = timezone.now()
+    try:
+        RouteCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={"route": route, "profile": profile, "created_at": now, "last_used_at": now},
+        )
+    except DatabaseError:
+        logger.exception("Could not store route cache entry %s", key)
+        return
+
+    max_entries = settings.ROUTE_CACHE_MAX_ENTRIES
+    if RouteCacheEntry.objects.count() > max_entries:
+        stale_ids = list(
+            RouteCacheEntry.objects.order_by("-last_used_at").values_list("id", flat=True)[max_entries:]
+        )
+        RouteCacheEntry.objects.filter(id__in=stale_ids).delete()
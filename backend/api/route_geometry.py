@@ -0,0 +1,82 @@
+"""
+Road geometry of a trip's route for map rendering.
+
+The steps' encoded polylines are joined once per trip, simplified with
+Douglas-Peucker for each of ROUTE_ZOOM_LEVELS and stored in TripRouteGeometry,
+so map requests never re-route or re-simplify.
+"""
+import hashlib
+
+from .geo import decode_polyline, encode_polyline, simplify_polyline, zoom_tolerance
+from .models import TripRouteGeometry
+from .planning import trip_to_eld_input
+from .routing import get_trip_legs
+
+# Each level keeps every point more than one pixel off the line at that zoom
+ROUTE_ZOOM_LEVELS = (5, 8, 11, 14)
+FULL_LEVEL = "full"
+
+
+def leg_points(leg):
+    """
+    A leg's road path from its step geometries; steps without one (offline providers)
+    contribute the straight line between their endpoints
+    """
+    if leg.get('geometry'):
+        # Cached before the geometry moved onto the steps
+        return decode_polyline(leg['geometry'])
+    points = []
+    for step in leg['steps']:
+        if step.get('geometry'):
+            points.extend(decode_polyline(step['geometry']))
+        else:
+            points.append((step['start_location']['lat'], step['start_location']['lon']))
+            points.append((step['end_location']['lat'], step['end_location']['lon']))
+    return points
+
+
+def build_route_levels(legs):
+    points = []
+    for leg in legs:
+        for point in leg_points(leg):
+            if not points or points[-1] != point:
+                points.append(point)
+
+    levels = {FULL_LEVEL: encode_polyline(points)}
+    for zoom in ROUTE_ZOOM_LEVELS:
+        levels[str(zoom)] = encode_polyline(simplify_polyline(points, zoom_tolerance(zoom)))
+    return levels
+
+
+def get_route_geometry(trip):
+    """
+    The trip's stored TripRouteGeometry, routed and stored on first use.
+    Raises ValueError when a leg can't be routed.
+    """
+    try:
+        return trip.route_geometry
+    except TripRouteGeometry.DoesNotExist:
+        pass
+
+    legs = get_trip_legs(trip_to_eld_input(trip))
+    for leg in legs:
+        if isinstance(leg, ValueError):
+            raise leg
+    levels = build_route_levels(legs)
+    geometry, _ = TripRouteGeometry.objects.update_or_create(
+        trip=trip,
+        defaults={"levels": levels, "etag": hashlib.sha1(levels[FULL_LEVEL].encode()).hexdigest()},
+    )
+    return geometry
+
+
+def level_for_zoom(zoom):
+    """
+    The coarsest stored level that is still accurate to a pixel at `zoom`, full detail without one
+    """
+    if zoom is None:
+        return FULL_LEVEL
+    for level in ROUTE_ZOOM_LEVELS:
+        if level >= zoom:
+            return str(level)
+    return FULL_LEVEL
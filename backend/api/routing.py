@@ -0,0 +1,419 @@
+import asyncio
+import math
+from abc import ABC, abstractmethod
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import http_client
+from .eld import trip_stops
+from .instrumentation import span
+from .geo import METERS_PER_MILE, decode_polyline, haversine_meters
+from .route_cache import route_cache_key, get_cached_route, store_route
+
+
+class RoutingProvider(ABC):
+    """
+    Base class for routing backends selected with settings.ROUTING_PROVIDER
+    """
+    # Part of the route cache key, so routes from different backends never mix
+    profile = "driving"
+    cacheable = True
+
+    @abstractmethod
+    def route_legs(self, waypoints):
+        """
+        One structured route per leg between consecutive (lat, lon) waypoints;
+        raises ValueError when no route can be built
+        """
+
+    @abstractmethod
+    def table(self, points):
+        """
+        Drive times and distances between every pair of (lat, lon) points, as
+        {'durations': hours, 'distances': miles} row-major matrices (row = from)
+        """
+
+    async def aroute_legs(self, waypoints):
+        """
+        Async route_legs(); providers that do network I/O should override this
+        """
+        return await sync_to_async(self.route_legs, thread_sensitive=False)(waypoints)
+
+
+class OSRMProvider(RoutingProvider):
+    """
+    OSRM HTTP API, either the public demo server or a self-hosted instance
+    """
+
+    # Step geometries carry the road path, so the overview is not needed; the per-node
+    # durations place stops by drive time along it
+    ROUTE_PARAMS = {"overview": "false", "steps": "true", "annotations": "duration"}
+    TABLE_PARAMS = {"annotations": "duration,distance"}
+
+    def __init__(self, base_url=None, profile="driving"):
+        self.base_url = (base_url or settings.OSRM_URL).rstrip("/")
+        self.profile = profile
+
+    def route_legs(self, waypoints):
+        """
+        Get route details for all waypoints from OSRM API in a single request
+        Returns one structured route per leg including steps, distance, and duration
+        """
+        try:
+            response = http_client.get(self.route_url(waypoints), params=self.ROUTE_PARAMS)
+            return self.parse_route_response(response, waypoints)
+        except Exception as e:
+            raise ValueError(f"Error fetching route: {str(e)}")
+
+    async def aroute_legs(self, waypoints):
+        try:
+            response = await http_client.aget(self.route_url(waypoints), params=self.ROUTE_PARAMS)
+            return self.parse_route_response(response, waypoints)
+        except Exception as e:
+            raise ValueError(f"Error fetching route: {str(e)}")
+
+    def table(self, points):
+        """
+        One /table request for the full duration and distance matrix
+        """
+        try:
+            response = http_client.get(self.service_url("table", points), params=self.TABLE_PARAMS)
+        except Exception as e:
+            raise ValueError(f"Error fetching route table: {str(e)}")
+        if response.status_code != 200:
+            raise ValueError(f"OSRM table request failed with status code {response.status_code}")
+
+        table_data = response.json()
+        durations = table_data.get('durations')
+        distances = table_data.get('distances')
+        if not durations or not distances:
+            raise ValueError("No table found in the OSRM response.")
+        if any(value is None for row in durations + distances for value in row):
+            raise ValueError("Some of the points can't be reached from each other.")
+        return {
+            'durations': [[value / 60 / 60 for value in row] for row in durations],  # hours
+            'distances': [[value / METERS_PER_MILE for value in row] for row in distances],  # miles
+        }
+
+    def route_url(self, waypoints):
+        return self.service_url("route", waypoints)
+
+    def service_url(self, service, points):
+        coordinates = ";".join(f"{lon},{lat}" for lat, lon in points)
+        return f"{self.base_url}/{service}/v1/{self.profile}/{coordinates}"
+
+    def parse_route_response(self, response, waypoints):
+        if response.status_code == 200:
+            route_data = response.json()
+
+            # Check if routes are available
+            if 'routes' in route_data and len(route_data['routes']) > 0:
+                route = route_data['routes'][0]
+                if len(route.get('legs', [])) != len(waypoints) - 1:
+                    raise ValueError("OSRM response legs do not match the requested waypoints.")
+                return [
+                    structure_leg(leg, end_lat, end_lon)
+                    for leg, (end_lat, end_lon) in zip(route['legs'], waypoints[1:])
+                ]
+            else:
+                raise ValueError("No routes found in the OSRM response.")
+        else:
+            raise ValueError(f"OSRM API request failed with status code {response.status_code}")
+
+
+class GreatCircleProvider(RoutingProvider):
+    """
+    Offline estimate: great-circle distance stretched by a road factor, driven at
+    a constant average speed and split into evenly sized steps so the HOS engine
+    can still place breaks and fuel stops along the way
+    """
+    profile = "greatcircle"
+    cacheable = False
+
+    def __init__(self, road_factor=1.25, average_speed_mph=55, step_miles=25):
+        self.road_factor = road_factor
+        self.average_speed_mph = average_speed_mph
+        self.step_miles = step_miles
+
+    def route_legs(self, waypoints):
+        return [
+            self.route_leg(start_lat, start_lon, end_lat, end_lon)
+            for (start_lat, start_lon), (end_lat, end_lon) in zip(waypoints, waypoints[1:])
+        ]
+
+    def table(self, points):
+        distances = [[self.distance(*start, *end) for end in points] for start in points]
+        return {
+            'durations': [[distance / self.average_speed_mph for distance in row] for row in distances],
+            'distances': distances,
+        }
+
+    def distance(self, start_lat, start_lon, end_lat, end_lon):
+        """
+        Estimated road miles between two points
+        """
+        return haversine_meters(start_lat, start_lon, end_lat, end_lon) / METERS_PER_MILE * self.road_factor
+
+    def route_leg(self, start_lat, start_lon, end_lat, end_lon):
+        distance = self.distance(start_lat, start_lon, end_lat, end_lon)
+        step_count = max(1, math.ceil(distance / self.step_miles))
+        step_distance = distance / step_count
+
+        steps = []
+        for index in range(step_count):
+            start_fraction = index / step_count
+            end_fraction = (index + 1) / step_count
+            steps.append({
+                'distance': step_distance,
+                'duration': step_distance / self.average_speed_mph,
+                'name': 'Estimated Route',
+                'start_location': {
+                    'lat': start_lat + start_fraction * (end_lat - start_lat),
+                    'lon': start_lon + start_fraction * (end_lon - start_lon)
+                },
+                'end_location': {
+                    'lat': start_lat + end_fraction * (end_lat - start_lat),
+                    'lon': start_lon + end_fraction * (end_lon - start_lon)
+                }
+            })
+        steps[-1]['end_location'] = {'lat': end_lat, 'lon': end_lon}
+
+        return {
+            'total_distance': distance,
+            'total_duration': distance / self.average_speed_mph,
+            'steps': steps
+        }
+
+
+def get_routing_provider():
+    """
+    Build the routing provider configured in settings.ROUTING_PROVIDER
+    """
+    config = settings.ROUTING_PROVIDER
+    provider_class = import_string(config["BACKEND"])
+    return provider_class(**config.get("OPTIONS", {}))
+
+
+def get_route(start_lat, start_lon, end_lat, end_lon):
+    """
+    Get route details between two points
+    Returns structured route data including steps, distance, and duration
+    """
+    return get_route_legs([(start_lat, start_lon), (end_lat, end_lon)])[0]
+
+
+def get_route_legs(waypoints):
+    """
+    Get one structured route per leg between consecutive (lat, lon) waypoints,
+    served from the route cache when the snapped waypoints were seen before
+    """
+    with span("route"):
+        return fetch_route_legs(waypoints)
+
+
+def fetch_route_legs(waypoints):
+    provider = get_routing_provider()
+    if not provider.cacheable:
+        return provider.route_legs(waypoints)
+
+    cache_key = route_cache_key(waypoints, provider.profile)
+    cached = get_cached_route(cache_key)
+    if cached is None:
+        legs = provider.route_legs(waypoints)
+        store_route(cache_key, {'legs': legs}, provider.profile)
+        return legs
+
+    return pin_leg_destinations(cached['legs'], waypoints)
+
+
+def get_route_table(points):
+    """
+    Duration (hours) and distance (miles) matrices between (lat, lon) points, served
+    from the route cache when the snapped points were seen before
+    """
+    with span("route"):
+        provider = get_routing_provider()
+        if not provider.cacheable:
+            return provider.table(points)
+
+        profile = f"{provider.profile}-table"
+        cache_key = route_cache_key(points, profile)
+        table = get_cached_route(cache_key)
+        if table is None:
+            table = provider.table(points)
+            store_route(cache_key, table, profile)
+        return table
+
+
+async def aget_route(start_lat, start_lon, end_lat, end_lon):
+    return (await aget_route_legs([(start_lat, start_lon), (end_lat, end_lon)]))[0]
+
+
+async def aget_route_legs(waypoints):
+    """
+    Async get_route_legs()
+    """
+    with span("route"):
+        return await afetch_route_legs(waypoints)
+
+
+async def afetch_route_legs(waypoints):
+    provider = get_routing_provider()
+    if not provider.cacheable:
+        return await provider.aroute_legs(waypoints)
+
+    cache_key = route_cache_key(waypoints, provider.profile)
+    cached = await sync_to_async(get_cached_route)(cache_key)
+    if cached is None:
+        legs = await provider.aroute_legs(waypoints)
+        await sync_to_async(store_route)(cache_key, {'legs': legs}, provider.profile)
+        return legs
+
+    return pin_leg_destinations(cached['legs'], waypoints)
+
+
+def pin_leg_destinations(legs, waypoints):
+    """
+    Cached routes may come from nearby waypoints, so pin each leg to the requested destination
+    """
+    for leg, (end_lat, end_lon) in zip(legs, waypoints[1:]):
+        if leg['steps']:
+            leg['steps'][-1]['end_location'] = {
+                'lat': end_lat,
+                'lon': end_lon
+            }
+    return legs
+
+
+def trip_waypoints(trip):
+    """
+    (lat, lon) of the trip's current location followed by each of its stops
+    """
+    return ((trip['current_latitude'], trip['current_longitude']),) + tuple(
+        (stop['latitude'], stop['longitude']) for stop in trip_stops(trip)
+    )
+
+
+def get_trip_legs(trip):
+    """
+    Fetch the drive legs (current -> each stop) for plan_trip in one routed request.
+    If that fails each leg is routed on its own, so one bad leg doesn't lose the others;
+    legs that still fail are passed on as their ValueError.
+    """
+    waypoints = trip_waypoints(trip)
+    try:
+        return get_route_legs(list(waypoints))
+    except ValueError:
+        pass
+
+    legs = []
+    truck_position = waypoints[0]
+    for destination in waypoints[1:]:
+        try:
+            legs.append(get_route(*truck_position, *destination))
+            truck_position = destination
+        except ValueError as e:
+            # The truck never got there, so the next leg starts where it still is
+            legs.append(e)
+    return legs
+
+
+async def aget_trip_legs(trip):
+    """
+    Async get_trip_legs(). When the routed request fails, all legs are fetched
+    at the same time; a leg after a failed one is re-routed from where the truck
+    still is.
+    """
+    waypoints = trip_waypoints(trip)
+    try:
+        return await aget_route_legs(list(waypoints))
+    except ValueError:
+        pass
+
+    pairs = list(zip(waypoints, waypoints[1:]))
+    results = await asyncio.gather(*(aget_route(*start, *end) for start, end in pairs), return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, ValueError):
+            raise result
+
+    legs = []
+    truck_position = waypoints[0]
+    for (start, destination), result in zip(pairs, results):
+        if start != truck_position:
+            try:
+                result = await aget_route(*truck_position, *destination)
+            except ValueError as e:
+                result = e
+        legs.append(result)
+        if not isinstance(result, ValueError):
+            truck_position = destination
+    return legs
+
+
+def structure_leg(leg, end_lat, end_lon):
+    """
+    Convert one OSRM route leg into the structured route format used by calculate_eld_logs
+    """
+    structured_route = {
+        'total_distance': leg['distance'] / METERS_PER_MILE,  # Convert meters to miles
+        'total_duration': leg['duration'] / 60 / 60,  # Convert seconds to hours
+        'steps': []
+    }
+
+    # Process each step of the leg
+    for step in leg['steps']:
+        structured_step = {
+            'distance': step['distance'] / METERS_PER_MILE,  # miles
+            'duration': step['duration'] / 60 / 60,   # hours
+            'name': step.get('name', 'Unnamed Road'),
+            'start_location': {
+                'lat': step['maneuver']['location'][1],
+                'lon': step['maneuver']['location'][0]
+            },
+            'end_location': {
+                'lat': step['maneuver']['location'][1],  # Will be updated below if available
+                'lon': step['maneuver']['location'][0]
+            }
+        }
+        if 'geometry' in step:
+            # Encoded road path of the step, used to place stops and draw the route
+            structured_step['geometry'] = step['geometry']
+        structured_route['steps'].append(structured_step)
+
+    # Ensure each step has proper end locations (which become the start location of the next step)
+    for i in range(len(structured_route['steps']) - 1):
+        structured_route['steps'][i]['end_location'] = structured_route['steps'][i + 1]['start_location']
+
+    # Make sure the last step ends at the leg's destination
+    if structured_route['steps']:
+        structured_route['steps'][-1]['end_location'] = {
+            'lat': end_lat,
+            'lon': end_lon
+        }
+
+    split_node_durations(structured_route['steps'], leg.get('annotation', {}).get('duration'))
+    return structured_route
+
+
+def split_node_durations(steps, durations):
+    """
+    Give each step the node_durations (hours between consecutive points of its geometry)
+    from the leg's per-node durations in seconds. Steps share their boundary points and the
+    zero-length arrive step has no nodes of its own, so nothing is added unless the counts
+    line up.
+    """
+    if not durations:
+        return
+    counts = [
+        len(decode_polyline(step['geometry'])) - 1 if step.get('geometry') and (step['distance'] or step['duration']) else 0
+        for step in steps
+    ]
+    if sum(counts) != len(durations):
+        return
+    offset = 0
+    for step, count in zip(steps, counts):
+        if count > 0:
+            step['node_durations'] = [value / 60 / 60 for value in durations[offset:offset + count]]
+        offset += count
@@ -1,6 +1,9 @@
+from django.db import transaction
 from rest_framework import serializers
 from api.models import CustomUser
-from .models import CustomUser, Trip
+from .eld import MAX_DRIVE_HOURS_BEFORE_BREAK, MAX_WEEKLY_HOURS
+from .models import CustomUser, Trip, TripStop
+from .stop_order import optimize_stop_order
 
 # Serializer for User registration
 class UserSerializer(serializers.ModelSerializer):
@@ -13,7 +16,18 @@ class UserSerializer(serializers.ModelSerializer):
         user = CustomUser.objects.create_user(**validated_data)
         return user
 
+class TripStopSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TripStop
+        fields = ['kind', 'location', 'latitude', 'longitude']
+
+
 class TripSerializer(serializers.ModelSerializer):
+    # Ordered stops after the current location; without them the trip is current -> pickup -> dropoff
+    stops = TripStopSerializer(many=True, required=False)
+    # Reorder the dropoffs after the last pickup for the least drive time before saving
+    optimize_stops = serializers.BooleanField(write_only=True, required=False, default=False)
+
     class Meta:
         model = Trip
         fields = [
@@ -21,6 +35,103 @@ class TripSerializer(serializers.ModelSerializer):
             'current_location', 'current_latitude', 'current_longitude',
             'pickup_location', 'pickup_latitude', 'pickup_longitude',
             'dropoff_location', 'dropoff_latitude', 'dropoff_longitude',
-            'current_cycle_used', 
+            'current_cycle_used', 'stops', 'optimize_stops',
             'created_at', 'updated_at', 'user'
-        ]
\ No newline at end of file
+        ]
+        # Set from the request in TripViewSet.perform_create
+        read_only_fields = ['user']
+        # Filled in from the stops when those are given
+        extra_kwargs = {
+            'pickup_location': {'required': False},
+            'dropoff_location': {'required': False},
+        }
+
+    def validate(self, attrs):
+        optimize = attrs.pop('optimize_stops', False)
+        stops = attrs.get('stops')
+        if stops is None:
+            if self.instance is None and not (attrs.get('pickup_location') and attrs.get('dropoff_location')):
+                raise serializers.ValidationError("Give pickup and dropoff locations, or a list of stops.")
+            return attrs
+        if not stops:
+            raise serializers.ValidationError({"stops": "A trip needs at least one stop."})
+        if stops[-1]['kind'] != TripStop.DROPOFF:
+            raise serializers.ValidationError({"stops": "The last stop must be a dropoff."})
+        if optimize:
+            try:
+                stops = attrs['stops'] = optimize_stop_order(self.current_point(attrs), stops)
+            except ValueError as e:
+                raise serializers.ValidationError({"optimize_stops": str(e)})
+
+        # The single pickup/dropoff fields mirror the first pickup and the final dropoff
+        pickup = next((stop for stop in stops if stop['kind'] == TripStop.PICKUP), stops[0])
+        for prefix, stop in (('pickup', pickup), ('dropoff', stops[-1])):
+            attrs[f'{prefix}_location'] = stop['location']
+            attrs[f'{prefix}_latitude'] = stop['latitude']
+            attrs[f'{prefix}_longitude'] = stop['longitude']
+        return attrs
+
+    def current_point(self, attrs):
+        return tuple(
+            attrs.get(field, getattr(self.instance, field, None))
+            for field in ('current_latitude', 'current_longitude')
+        )
+
+    def create(self, validated_data):
+        stops = validated_data.pop('stops', None)
+        with transaction.atomic():
+            trip = super().create(validated_data)
+            if stops:
+                self.save_stops(trip, stops)
+        return trip
+
+    def update(self, instance, validated_data):
+        stops = validated_data.pop('stops', None)
+        with transaction.atomic():
+            trip = super().update(instance, validated_data)
+            if stops is not None:
+                trip.stops.all().delete()
+                self.save_stops(trip, stops)
+            else:
+                self.sync_mirrored_stops(trip)
+        return trip
+
+    def sync_mirrored_stops(self, trip):
+        """
+        Copy pickup/dropoff edits onto the stops those fields mirror, since trips with
+        stops are planned from the stops
+        """
+        stops = list(trip.stops.all())
+        if not stops:
+            return
+        pickup = next((stop for stop in stops if stop.kind == TripStop.PICKUP), stops[0])
+        changed = set()
+        for prefix, stop in (('pickup', pickup), ('dropoff', stops[-1])):
+            for field in ('location', 'latitude', 'longitude'):
+                value = getattr(trip, f'{prefix}_{field}')
+                if value is not None and getattr(stop, field) != value:
+                    setattr(stop, field, value)
+                    changed.add(stop)
+        if changed:
+            TripStop.objects.bulk_update(changed, ['location', 'latitude', 'longitude'])
+
+    def save_stops(self, trip, stops):
+        TripStop.objects.bulk_create([
+            TripStop(trip=trip, position=position, **stop) for position, stop in enumerate(stops)
+        ])
+        # Drop any stops prefetched before the write
+        getattr(trip, '_prefetched_objects_cache', {}).pop('stops', None)
+
+
+class ScenarioSerializer(serializers.Serializer):
+    """
+    One what-if parameter set for trip_scenarios; omitted fields keep the trip's value or the engine default
+    """
+    name = serializers.CharField(required=False, max_length=100)
+    start_time = serializers.TimeField(required=False)  # First shift, today
+    current_cycle_used = serializers.FloatField(required=False, min_value=0, max_value=MAX_WEEKLY_HOURS)
+    # A break is due after at most 8 driving hours and lasts at least 30 minutes
+    drive_hours_before_break = serializers.FloatField(required=False, min_value=0.5, max_value=MAX_DRIVE_HOURS_BEFORE_BREAK)
+    break_minutes = serializers.IntegerField(required=False, min_value=30, max_value=600)
+    fuel_stop_miles = serializers.FloatField(required=False, min_value=50)
+    fuel_stop_minutes = serializers.IntegerField(required=False, min_value=5, max_value=240)
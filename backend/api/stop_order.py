@@ -0,0 +1,148 @@
+"""
+Visiting order for multi-drop trips.
+
+Dropoffs after a trip's last pickup can be delivered in any order, so they are
+reordered to minimise drive time: one routing table gives the drive times
+between all of them, nearest-neighbour builds a first path from the last pickup
+(or the current location) and 2-opt / Or-opt moves improve it until nothing
+helps or settings.STOP_ORDER_TIME_BUDGET runs out. Paths are open (the truck
+doesn't come back) and the drive times may differ per direction.
+"""
+import time
+
+from django.conf import settings
+
+from .models import TripStop
+from .routing import get_route_table
+
+# Smallest saving (hours) worth a move, so float noise can't make the search cycle
+MIN_GAIN = 1e-9
+
+
+def path_cost(matrix, path):
+    return sum(matrix[start][end] for start, end in zip(path, path[1:]))
+
+
+def nearest_neighbour(matrix, nodes):
+    """
+    Path from nodes[0] that always drives to the closest unvisited node next
+    """
+    path = [nodes[0]]
+    remaining = set(nodes[1:])
+    while remaining:
+        last = path[-1]
+        closest = min(remaining, key=lambda node: (matrix[last][node], node))
+        path.append(closest)
+        remaining.remove(closest)
+    return path
+
+
+def two_opt(matrix, path, deadline):
+    """
+    Reverse path[i:j + 1] wherever that shortens the path. The reversed segment's
+    cost comes from prefix sums of the forward and backward edge costs, so each
+    candidate move is O(1) even with one-way costs. Returns whether any move was made.
+    """
+    improved = False
+    forward, backward = edge_prefix_sums(matrix, path)
+    for i in range(1, len(path) - 1):
+        if time.perf_counter() > deadline:
+            break
+        for j in range(i + 1, len(path)):
+            before = matrix[path[i - 1]][path[i]] + forward[j] - forward[i]
+            after = matrix[path[i - 1]][path[j]] + backward[j] - backward[i]
+            if j + 1 < len(path):
+                before += matrix[path[j]][path[j + 1]]
+                after += matrix[path[i]][path[j + 1]]
+            if after < before - MIN_GAIN:
+                path[i:j + 1] = path[i:j + 1][::-1]
+                forward, backward = edge_prefix_sums(matrix, path)
+                improved = True
+    return improved
+
+
+def edge_prefix_sums(matrix, path):
+    forward = [0.0]
+    backward = [0.0]
+    for start, end in zip(path, path[1:]):
+        forward.append(forward[-1] + matrix[start][end])
+        backward.append(backward[-1] + matrix[end][start])
+    return forward, backward
+
+
+def or_opt(matrix, path, deadline, max_segment=3):
+    """
+    Move runs of up to max_segment consecutive nodes, in their own direction, to
+    the cheapest other place in the path. Returns whether any move was made.
+    """
+    improved = False
+    for length in range(1, max_segment + 1):
+        i = 1
+        while i + length <= len(path):
+            if time.perf_counter() > deadline:
+                return improved
+            segment = path[i:i + length]
+            rest = path[:i] + path[i + length:]
+            first, last = segment[0], segment[-1]
+            previous = path[i - 1]
+            following = path[i + length] if i + length < len(path) else None
+
+            removed = matrix[previous][first]
+            if following is not None:
+                removed += matrix[last][following] - matrix[previous][following]
+
+            best_gain, best_position = MIN_GAIN, None
+            for k, node in enumerate(rest):
+                if k == i - 1:
+                    continue  # Where the segment already is
+                after = rest[k + 1] if k + 1 < len(rest) else None
+                added = matrix[node][first]
+                if after is not None:
+                    added += matrix[last][after] - matrix[node][after]
+                if removed - added > best_gain:
+                    best_gain, best_position = removed - added, k
+
+            if best_position is None:
+                i += 1
+                continue
+            path[:] = rest[:best_position + 1] + segment + rest[best_position + 1:]
+            improved = True
+    return improved
+
+
+def solve_open_path(matrix, nodes, time_budget):
+    """
+    Short path that starts at nodes[0] and visits all other nodes once, as a list of
+    nodes. Starts from the better of the given order and nearest-neighbour.
+    """
+    deadline = time.perf_counter() + time_budget
+    path = min(list(nodes), nearest_neighbour(matrix, nodes), key=lambda path: path_cost(matrix, path))
+    while time.perf_counter() < deadline:
+        # Evaluate both so a 2-opt improvement never skips the Or-opt pass
+        if not (two_opt(matrix, path, deadline) | or_opt(matrix, path, deadline)):
+            break
+    return path
+
+
+def optimize_stop_order(origin, stops):
+    """
+    Reorder the dropoffs after the last pickup in `stops` (dicts with kind, latitude and
+    longitude) to cut drive time from origin, the (lat, lon) where the truck starts.
+    Everything up to the last pickup keeps its order. Raises ValueError when the
+    routing table can't be fetched.
+    """
+    last_pickup = max((index for index, stop in enumerate(stops) if stop['kind'] == TripStop.PICKUP), default=-1)
+    fixed, drops = list(stops[:last_pickup + 1]), list(stops[last_pickup + 1:])
+    if len(drops) < 2:
+        return fixed + drops
+
+    start = (fixed[-1]['latitude'], fixed[-1]['longitude']) if fixed else origin
+    if None in start:
+        raise ValueError("The current location needs coordinates to order the stops.")
+    points = [start] + [(stop['latitude'], stop['longitude']) for stop in drops]
+    if len(points) > settings.STOP_ORDER_MAX_POINTS:
+        raise ValueError(f"At most {settings.STOP_ORDER_MAX_POINTS - 1} dropoffs can be ordered at once.")
+
+    durations = get_route_table(points)['durations']
+    path = solve_open_path(durations, list(range(len(points))), settings.STOP_ORDER_TIME_BUDGET)
+    return fixed + [drops[node - 1] for node in path[1:]]
@@ -1,3 +1,1704 @@
-from django.test import TestCase
+import asyncio
+import copy
+import json
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.db import DataError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import CacheCounter, CustomUser, GeocodeCacheEntry, RouteCacheEntry, Trip, TripEldLog, TripStop
+from . import eld, geocoding, http_client, planning, routing, views
+from .stop_order import nearest_neighbour, path_cost, solve_open_path
+from .fake_upstream import FakeUpstream
+from .geo import METERS_PER_MILE, bounding_boxes, decode_polyline, encode_polyline, geohash_encode, simplify_polyline
+from .db_router import ReplicaRouter, replica_reads
+from .geocode_cache import geocode_cache_key
+from .route_cache import route_cache_key
+
+
+def make_legs(waypoints):
+    return [make_route(*start, *end) for start, end in zip(waypoints, waypoints[1:])]
+
+
+def make_route(start_lat, start_lon, end_lat, end_lon):
+    return {
+        'total_distance': 10.0,
+        'total_duration': 0.25,
+        'steps': [{
+            'distance': 10.0,
+            'duration': 0.25,
+            'name': 'Test Road',
+            'start_location': {'lat': start_lat, 'lon': start_lon},
+            'end_location': {'lat': end_lat, 'lon': end_lon},
+        }]
+    }
+
+
+class RouteCacheTests(TestCase):
+    def test_repeat_route_skips_network(self):
+        with mock.patch.object(routing.OSRMProvider, 'route_legs', side_effect=make_legs) as fetch:
+            first = routing.get_route(40.0, -75.0, 41.0, -76.0)
+            second = routing.get_route(40.00001, -75.00001, 41.0, -76.0)
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(first, second)
+        counter = CacheCounter.objects.get(name='route')
+        self.assertEqual((counter.hits, counter.misses), (1, 1))
+
+    def test_cached_route_ends_at_requested_destination(self):
+        with mock.patch.object(routing.OSRMProvider, 'route_legs', side_effect=make_legs):
+            routing.get_route(40.0, -75.0, 41.0, -76.0)
+            route = routing.get_route(40.0, -75.0, 41.00002, -76.0)
+
+        self.assertEqual(route['steps'][-1]['end_location'], {'lat': 41.00002, 'lon': -76.0})
+
+    def test_expired_entry_is_refetched(self):
+        with mock.patch.object(routing.OSRMProvider, 'route_legs', side_effect=make_legs) as fetch:
+            routing.get_route(40.0, -75.0, 41.0, -76.0)
+            RouteCacheEntry.objects.update(created_at=timezone.now() - timedelta(days=30))
+            routing.get_route(40.0, -75.0, 41.0, -76.0)
+
+        self.assertEqual(fetch.call_count, 2)
+
+    @override_settings(ROUTE_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_entry_is_evicted(self):
+        with mock.patch.object(routing.OSRMProvider, 'route_legs', side_effect=make_legs) as fetch:
+            routing.get_route(40.0, -75.0, 41.0, -76.0)
+            routing.get_route(42.0, -75.0, 41.0, -76.0)
+            RouteCacheEntry.objects.filter(key=route_cache_key([(40.0, -75.0), (41.0, -76.0)])).update(
+                last_used_at=timezone.now() + timedelta(minutes=1)
+            )
+            routing.get_route(43.0, -75.0, 41.0, -76.0)
+            routing.get_route(40.0, -75.0, 41.0, -76.0)
+
+        self.assertEqual(fetch.call_count, 3)
+        self.assertEqual(RouteCacheEntry.objects.count(), 2)
+        self.assertFalse(RouteCacheEntry.objects.filter(key=route_cache_key([(42.0, -75.0), (41.0, -76.0)])).exists())
+
+    def test_keys_fit_the_column_for_many_points(self):
+        points = [(40.0 + index / 100, -75.0 - index / 100) for index in range(100)]
+
+        key = route_cache_key(points, 'driving-table')
+
+        self.assertLessEqual(len(key), RouteCacheEntry._meta.get_field('key').max_length)
+        self.assertNotEqual(key, route_cache_key(points[:-1], 'driving-table'))
+
+
+class StoredEldLogTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='driver', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            user=self.user,
+            current_location='Philadelphia', current_latitude=40.0, current_longitude=-75.0,
+            pickup_location='Harrisburg', pickup_latitude=40.3, pickup_longitude=-76.9,
+            dropoff_location='Pittsburgh', dropoff_latitude=40.4, dropoff_longitude=-80.0,
+            current_cycle_used=10,
+        )
+
+    def get_details(self):
+        return self.client.get(f'/api/trip-details/{self.trip.id}/')
+
+    def test_details_are_served_from_stored_logs(self):
+        with mock.patch.object(routing, 'get_route_legs', side_effect=make_legs) as get_route_legs:
+            first = self.get_details()
+            second = self.get_details()
+
+        self.assertEqual(get_route_legs.call_count, 1)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(TripEldLog.objects.get(trip=self.trip).engine_version, planning.ELD_ENGINE_VERSION)
+
+    def test_stored_details_move_to_today(self):
+        with mock.patch.object(routing, 'get_route_legs', side_effect=make_legs):
+            fresh = self.get_details().json()
+        stored = TripEldLog.objects.get(trip=self.trip)
+        stored.data = eld.rebase_plan_dates(stored.data, datetime.now().date() - timedelta(days=7))
+        stored.save()
+
+        replayed = self.get_details().json()
+
+        self.assertEqual(replayed, fresh)
+        self.assertEqual(replayed['daily_summaries'][0]['date'], datetime.now().date().isoformat())
+
+    def test_stored_details_cost_one_query_with_jwt(self):
+        with mock.patch.object(routing, 'get_route_legs', side_effect=make_legs):
+            self.get_details()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+        with self.assertNumQueries(1):
+            response = client.get(f'/api/trip-details/{self.trip.id}/')
+        self.assertEqual(response.status_code, 200)
+
+        other = CustomUser.objects.create_user(username='other', password='secret')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        self.assertEqual(client.get(f'/api/trip-details/{self.trip.id}/').status_code, 403)
+        self.assertEqual(client.get('/api/user/').json()['username'], 'other')
+
+    def test_recomputed_details_read_stops_once(self):
+        for url in (f'/api/trip-details/{self.trip.id}/', f'/api/trip-details/{self.trip.id}/stream/'):
+            TripEldLog.objects.filter(trip=self.trip).delete()
+            with mock.patch.object(routing, 'get_route_legs', side_effect=make_legs), \
+                    CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+                b''.join(getattr(response, 'streaming_content', []))
+            with self.subTest(url=url):
+                self.assertEqual(sum('"api_tripstop"' in query['sql'] for query in queries.captured_queries), 1)
+                self.assertTrue(TripEldLog.objects.filter(trip=self.trip).exists())
+
+    def test_engine_version_bump_recomputes(self):
+        with mock.patch.object(routing, 'get_route_legs', side_effect=make_legs) as get_route_legs:
+            self.get_details()
+            with mock.patch.object(planning, 'ELD_ENGINE_VERSION', planning.ELD_ENGINE_VERSION + 1):
+                self.get_details()
+
+        self.assertEqual(get_route_legs.call_count, 2)
+
+    def test_route_errors_are_not_stored(self):
+        with mock.patch.object(routing.OSRMProvider, 'route_legs', side_effect=ValueError('offline')):
+            self.get_details()
+
+        self.assertFalse(TripEldLog.objects.exists())
+
+    def update_trip(self, **changes):
+        data = {field: getattr(self.trip, field) for field in Trip.ELD_INPUT_FIELDS}
+        data.update(changes)
+        return self.client.put(f'/api/trips/{self.trip.id}/', {**data, 'user': self.user.id}, format='json')
+
+    def test_input_change_invalidates_stored_logs(self):
+        with mock.patch.object(routing, 'get_route_legs', side_effect=make_legs):
+            self.get_details()
+        self.update_trip(current_cycle_used=20)
+
+        self.assertFalse(TripEldLog.objects.exists())
+
+    def test_unchanged_inputs_keep_stored_logs(self):
+        with mock.patch.object(routing, 'get_route_legs', side_effect=make_legs):
+            self.get_details()
+        self.update_trip()
+
+        self.assertTrue(TripEldLog.objects.exists())
+
+    def test_streamed_days_match_trip_details(self):
+        def long_legs(waypoints):
+            legs = make_legs(waypoints)
+            for leg in legs:
+                leg['total_distance'] = leg['steps'][0]['distance'] = 1500.0
+                leg['total_duration'] = leg['steps'][0]['duration'] = 25.0
+            return legs
+
+        with mock.patch.object(routing, 'get_route_legs', side_effect=long_legs) as get_route_legs:
+            lines = parse_ndjson(self.client.get(f'/api/trip-details/{self.trip.id}/stream/'))
+            details = self.get_details().json()
+            replayed = parse_ndjson(self.client.get(f'/api/trip-details/{self.trip.id}/stream/'))
+
+        self.assertEqual(get_route_legs.call_count, 1)
+        self.assertGreater(len(lines), 3)
+        self.assertEqual([line['type'] for line in lines], ['day'] * (len(lines) - 1) + ['trip'])
+        self.assertEqual([{k: v for k, v in line.items() if k != 'type'} for line in lines[:-1]], details['daily_summaries'])
+        self.assertEqual(lines[-1]['total_days'], details['total_days'])
+        self.assertEqual(replayed, lines)
+
+    def test_long_streamed_trips_are_not_stored(self):
+        with override_settings(ELD_STREAM_STORE_MAX_DAYS=0), \
+                mock.patch.object(routing, 'get_route_legs', side_effect=make_legs):
+            lines = parse_ndjson(self.client.get(f'/api/trip-details/{self.trip.id}/stream/'))
+
+        self.assertEqual(lines[-1]['type'], 'trip')
+        self.assertFalse(TripEldLog.objects.exists())
+
+
+class MultiStopTripTests(TestCase):
+    stops = [
+        {'kind': 'pickup', 'location': 'Harrisburg', 'latitude': 40.3, 'longitude': -76.9},
+        {'kind': 'pickup', 'location': 'Altoona', 'latitude': 40.5, 'longitude': -78.4},
+        {'kind': 'dropoff', 'location': 'Pittsburgh', 'latitude': 40.4, 'longitude': -80.0},
+        {'kind': 'dropoff', 'location': 'Columbus', 'latitude': 40.0, 'longitude': -83.0},
+    ]
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='driver', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_trip(self, stops):
+        return self.client.post('/api/trips/', {
+            'current_location': 'Philadelphia', 'current_latitude': 40.0, 'current_longitude': -75.0,
+            'current_cycle_used': 10, 'stops': stops,
+        }, format='json')
+
+    def test_stops_are_stored_in_order_and_planned_in_one_route(self):
+        response = self.create_trip(self.stops)
+        self.assertEqual(response.status_code, 201)
+        trip = Trip.objects.get(id=response.json()['id'])
+        self.assertEqual((trip.pickup_location, trip.dropoff_location), ('Harrisburg', 'Columbus'))
+        self.assertEqual(self.client.get(f'/api/trips/{trip.id}/').json()['stops'], self.stops)
+
+        with mock.patch.object(routing, 'get_route_legs', side_effect=make_legs) as get_route_legs:
+            data = self.client.get(f'/api/trip-details/{trip.id}/').json()
+
+        get_route_legs.assert_called_once_with([(40.0, -75.0)] + [(stop['latitude'], stop['longitude']) for stop in self.stops])
+        activities = [
+            (log['notes'], log['location']['name'])
+            for day in data['daily_summaries'] for log in day['logs'] if log['notes'].endswith('Activity')
+        ]
+        self.assertEqual(activities, [
+            ('Pickup Activity', 'Harrisburg'), ('Pickup Activity', 'Altoona'),
+            ('Dropoff Activity', 'Pittsburgh'), ('Dropoff Activity', 'Columbus'),
+        ])
+
+    def test_changing_stops_invalidates_stored_logs(self):
+        trip_id = self.create_trip(self.stops).json()['id']
+        with mock.patch.object(routing, 'get_route_legs', side_effect=make_legs):
+            self.client.get(f'/api/trip-details/{trip_id}/')
+        trip = self.client.get(f'/api/trips/{trip_id}/').json()
+
+        self.client.put(f'/api/trips/{trip_id}/', {**trip, 'stops': self.stops[1:]}, format='json')
+
+        self.assertEqual(TripStop.objects.filter(trip_id=trip_id).count(), 3)
+        self.assertFalse(TripEldLog.objects.exists())
+
+    def test_pickup_and_dropoff_edits_without_stops_move_the_mirrored_stops(self):
+        trip_id = self.create_trip(self.stops).json()['id']
+        with mock.patch.object(routing, 'get_route_legs', side_effect=make_legs):
+            self.client.get(f'/api/trip-details/{trip_id}/')
+        trip = self.client.get(f'/api/trips/{trip_id}/').json()
+        del trip['stops']
+
+        self.client.put(f'/api/trips/{trip_id}/', {
+            **trip, 'dropoff_location': 'Dayton', 'dropoff_latitude': 39.8, 'dropoff_longitude': -84.2,
+        }, format='json')
+
+        self.assertFalse(TripEldLog.objects.exists())
+        stops = list(TripStop.objects.filter(trip_id=trip_id).values_list('location', 'latitude', 'longitude'))
+        self.assertEqual(len(stops), 4)
+        self.assertEqual(stops[0], ('Harrisburg', 40.3, -76.9))
+        self.assertEqual(stops[-1], ('Dayton', 39.8, -84.2))
+
+    def test_failed_route_cache_write_does_not_fail_the_plan(self):
+        stops = [
+            {'kind': 'dropoff', 'location': f'Stop {index}', 'latitude': 40.0, 'longitude': -75.5 - index / 2}
+            for index in range(15)
+        ]
+        trip_id = self.create_trip(stops).json()['id']
+
+        with mock.patch.object(routing.OSRMProvider, 'route_legs', side_effect=make_legs), \
+                mock.patch.object(RouteCacheEntry.objects, 'update_or_create', side_effect=DataError), \
+                self.assertLogs('api.route_cache', level='ERROR'):
+            response = self.client.get(f'/api/trip-details/{trip_id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(planning.has_route_errors(response.json()))
+        self.assertTrue(TripEldLog.objects.filter(trip_id=trip_id).exists())
+
+    def test_last_stop_must_be_a_dropoff(self):
+        response = self.create_trip(self.stops[:2])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Trip.objects.exists())
+
+
+class StopOrderTests(TestCase):
+    def test_solver_improves_on_nearest_neighbour_for_many_stops(self):
+        rng = random.Random(7)
+        points = [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(61)]
+        # One-way costs: driving east is slower
+        matrix = [
+            [abs(ax - bx) * (1.2 if bx > ax else 1) + abs(ay - by) for bx, by in points]
+            for ax, ay in points
+        ]
+        nodes = list(range(len(points)))
+
+        started = time.perf_counter()
+        path = solve_open_path(matrix, nodes, time_budget=0.5)
+
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(path[0], 0)
+        self.assertEqual(sorted(path), nodes)
+        self.assertLess(path_cost(matrix, path), path_cost(matrix, nearest_neighbour(matrix, nodes)))
+
+    @override_settings(ROUTING_PROVIDER={'BACKEND': 'api.routing.GreatCircleProvider', 'OPTIONS': {}})
+    def test_optimize_stops_reorders_dropoffs_after_the_last_pickup(self):
+        user = CustomUser.objects.create_user(username='driver', password='secret')
+        client = APIClient()
+        client.force_authenticate(user)
+        dropoffs = [('Columbus', -83.0), ('Pittsburgh', -80.0), ('Indianapolis', -86.2), ('Wheeling', -80.7)]
+
+        response = client.post('/api/trips/', {
+            'current_location': 'Philadelphia', 'current_latitude': 40.0, 'current_longitude': -75.0,
+            'current_cycle_used': 10, 'optimize_stops': True,
+            'stops': [{'kind': 'pickup', 'location': 'Harrisburg', 'latitude': 40.3, 'longitude': -76.9}] + [
+                {'kind': 'dropoff', 'location': name, 'latitude': 40.0, 'longitude': lon} for name, lon in dropoffs
+            ],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [stop['location'] for stop in response.json()['stops']],
+            ['Harrisburg', 'Pittsburgh', 'Wheeling', 'Columbus', 'Indianapolis'],
+        )
+        self.assertEqual(Trip.objects.get().dropoff_location, 'Indianapolis')
+
+
+@override_settings(
+    ROUTING_PROVIDER={'BACKEND': 'api.routing.GreatCircleProvider', 'OPTIONS': {}},
+    BATCH_PLAN_WORKERS=0,
+)
+class TripScenarioTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='dispatch', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trip = Trip.objects.create(
+            user=self.user,
+            current_location='Philadelphia', current_latitude=40.0, current_longitude=-75.0,
+            pickup_location='Harrisburg', pickup_latitude=40.3, pickup_longitude=-76.9,
+            dropoff_location='Denver', dropoff_latitude=39.7, dropoff_longitude=-105.0,
+            current_cycle_used=20,
+        )
+
+    def compare(self, scenarios):
+        return self.client.post(f'/api/trip-details/{self.trip.id}/scenarios/', {'scenarios': scenarios}, format='json')
+
+    def test_scenarios_share_one_route(self):
+        with mock.patch.object(routing, 'get_route_legs', wraps=routing.get_route_legs) as get_route_legs:
+            response = self.compare([
+                {'name': 'default'},
+                {'name': 'early', 'start_time': '05:00', 'current_cycle_used': 60},
+                {'name': 'short tanks', 'fuel_stop_miles': 400, 'break_minutes': 45},
+            ])
+
+        self.assertEqual(response.status_code, 200)
+        get_route_legs.assert_called_once()
+        default, early, short_tanks = response.json()['scenarios']
+        details = planning.calculate_eld_logs(planning.trip_to_eld_input(self.trip))
+        self.assertEqual(
+            {key: default[key] for key in ('start_time', 'end_time', 'total_miles', 'total_days')},
+            {key: details[key] for key in ('start_time', 'end_time', 'total_miles', 'total_days')},
+        )
+        self.assertTrue(early['start_time'].endswith('T05:00:00'))
+        self.assertEqual((default['current_cycle_used'], early['current_cycle_used']), (20, 60))
+        self.assertEqual((default['restarts'], early['restarts']), (0, 1))
+        self.assertGreater(short_tanks['fuel_stops'], default['fuel_stops'])
+        self.assertGreater(short_tanks['total_on_duty_hours'], default['total_on_duty_hours'])
+
+    def test_every_scenario_drives_the_whole_route(self):
+        rows = self.compare([
+            {}, {'fuel_stop_miles': 50}, {'drive_hours_before_break': 0.5}, {'start_time': '23:30'},
+            {'current_cycle_used': 69},
+        ]).json()['scenarios']
+
+        legs = routing.get_trip_legs(planning.trip_to_eld_input(self.trip))
+        route_miles = sum(step['distance'] for leg in legs for step in leg['steps'])
+        for row in rows:
+            self.assertAlmostEqual(row['total_miles'], route_miles, delta=0.01)
+
+    def test_invalid_scenarios(self):
+        self.assertEqual(self.compare([]).status_code, 400)
+        self.assertEqual(self.compare([{'break_minutes': 10}]).status_code, 400)
+        with override_settings(SCENARIO_MAX_COUNT=1):
+            self.assertEqual(self.compare([{}, {}]).status_code, 400)
+
+    @override_settings(BATCH_PLAN_WORKERS=2)
+    def test_scenarios_plan_inline_in_order(self):
+        with mock.patch.object(planning, 'ProcessPoolExecutor') as pool:
+            rows = self.compare([{'name': 'late', 'start_time': '09:00'}, {'name': 'early', 'start_time': '04:00'}]).json()['scenarios']
+
+        pool.assert_not_called()
+        self.assertEqual([row['name'] for row in rows], ['late', 'early'])
+        self.assertTrue(rows[0]['start_time'].endswith('T09:00:00'))
+
+
+class TripListTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='driver', password='secret')
+        self.other = CustomUser.objects.create_user(username='other', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        for user in (self.user, self.other):
+            for index in range(5):
+                trip = Trip.objects.create(
+                    user=user,
+                    current_location=f'Start {index}', current_latitude=40.0, current_longitude=-75.0,
+                    pickup_location='Harrisburg', pickup_latitude=40.3, pickup_longitude=-76.9,
+                    dropoff_location='Pittsburgh', dropoff_latitude=40.4, dropoff_longitude=-80.0,
+                    current_cycle_used=10,
+                )
+                Trip.objects.filter(id=trip.id).update(created_at=now - timedelta(hours=index))
+
+    def test_lists_own_trips_newest_first_across_pages(self):
+        response = self.client.get('/api/trips/', {'page_size': 2}).json()
+        names = [trip['current_location'] for trip in response['results']]
+        while response['next']:
+            response = self.client.get(response['next']).json()
+            names += [trip['current_location'] for trip in response['results']]
+
+        self.assertEqual(names, [f'Start {index}' for index in range(5)])
+
+    def test_other_users_trips_are_hidden(self):
+        foreign = Trip.objects.filter(user=self.other).first()
+
+        self.assertEqual(self.client.get(f'/api/trips/{foreign.id}/').status_code, 404)
+
+    def test_new_trips_belong_to_the_requesting_user(self):
+        response = self.client.post('/api/trips/', {
+            'current_location': 'Philadelphia', 'current_latitude': 40.0, 'current_longitude': -75.0,
+            'pickup_location': 'Harrisburg', 'pickup_latitude': 40.3, 'pickup_longitude': -76.9,
+            'dropoff_location': 'Pittsburgh', 'dropoff_latitude': 40.4, 'dropoff_longitude': -80.0,
+            'current_cycle_used': 10, 'user': self.other.id,
+        }, format='json')
+
+        self.assertEqual(response.json()['user'], self.user.id)
+        self.assertEqual(self.client.get('/api/trips/').json()['results'][0]['id'], response.json()['id'])
+
+
+class NearbyTripsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='dispatch', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Pickups roughly 0, 30, 70 and 250 miles from Pittsburgh
+        for name, lat, lon in [('Pittsburgh', 40.4406, -79.9959), ('Washington PA', 40.1740, -80.2462),
+                               ('Altoona', 40.5187, -78.3947), ('Harrisburg', 40.2732, -76.8867)]:
+            self.create_trip(name, lat, lon)
+        other = CustomUser.objects.create_user(username='other', password='secret')
+        self.create_trip('Pittsburgh (other fleet)', 40.4406, -79.9959, user=other)
+
+    def create_trip(self, pickup, lat, lon, user=None):
+        return Trip.objects.create(
+            user=user or self.user,
+            current_location='Philadelphia', current_latitude=40.0, current_longitude=-75.0,
+            pickup_location=pickup, pickup_latitude=lat, pickup_longitude=lon,
+            dropoff_location='Columbus', dropoff_latitude=39.9612, dropoff_longitude=-82.9988,
+            current_cycle_used=10,
+        )
+
+    def nearby(self, **params):
+        return self.client.get('/api/trips/nearby/', {'lat': 40.4406, 'lon': -79.9959, **params})
+
+    def test_finds_pickups_within_radius_nearest_first(self):
+        results = self.nearby(radius=100).json()['results']
+
+        self.assertEqual([trip['pickup_location'] for trip in results], ['Pittsburgh', 'Washington PA', 'Altoona'])
+        self.assertEqual(results[0]['distance_miles'], 0)
+
+    def test_searches_the_requested_point(self):
+        self.assertEqual(len(self.nearby(point='dropoff', radius=100).json()['results']), 0)
+        self.assertEqual(len(self.nearby(point='dropoff', radius=200).json()['results']), 4)
+        self.assertEqual(self.nearby(point='route').status_code, 400)
+
+    def test_geohashes_follow_coordinate_edits(self):
+        trip = Trip.objects.get(pickup_location='Harrisburg')
+        self.assertEqual(trip.pickup_geohash, geohash_encode(40.2732, -76.8867, 9))
+
+        trip.pickup_latitude, trip.pickup_longitude = 40.45, -80.0
+        trip.save(update_fields=['pickup_latitude', 'pickup_longitude'])
+
+        self.assertEqual(len(self.nearby(radius=5).json()['results']), 2)
+
+    def test_searches_across_the_antimeridian_and_poles(self):
+        for name, lat, lon in [('Suva side', -16.5, 179.9), ('Taveuni side', -16.5, -179.9), ('Svalbard', 89.6, 170.0)]:
+            self.create_trip(name, lat, lon)
+
+        across = self.client.get('/api/trips/nearby/', {'lat': -16.5, 'lon': 179.95, 'radius': 20}).json()['results']
+        polar = self.client.get('/api/trips/nearby/', {'lat': 89.5, 'lon': -10.0, 'radius': 100}).json()['results']
+
+        self.assertEqual({trip['pickup_location'] for trip in across}, {'Suva side', 'Taveuni side'})
+        self.assertEqual([trip['pickup_location'] for trip in polar], ['Svalbard'])
+
+    def test_bounding_boxes_split_at_the_antimeridian(self):
+        self.assertEqual(len(bounding_boxes(40.0, -80.0, 50_000)), 1)
+        east, west = bounding_boxes(0.0, 179.9, 50_000)
+        self.assertEqual((east[3], west[1]), (180.0, -180.0))
+        self.assertLess(west[3], -179.0)
+        (polar,) = bounding_boxes(89.0, 0.0, 500 * 1609.344)
+        self.assertEqual((polar[1], polar[2], polar[3]), (-180.0, 90.0, 180.0))
+
+
+def parse_ndjson(response):
+    body = b"".join(response.streaming_content).decode()
+    return [json.loads(line) for line in body.splitlines()]
+
+
+@override_settings(
+    ROUTING_PROVIDER={'BACKEND': 'api.routing.GreatCircleProvider', 'OPTIONS': {}},
+    BATCH_PLAN_WORKERS=0,
+)
+class BatchTripDetailsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='dispatch', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.trips = [self.create_trip(dropoff_latitude=40.4 + index % 2) for index in range(4)]
+
+    def create_trip(self, user=None, **overrides):
+        fields = dict(
+            current_location='Philadelphia', current_latitude=40.0, current_longitude=-75.0,
+            pickup_location='Harrisburg', pickup_latitude=40.3, pickup_longitude=-76.9,
+            dropoff_location='Pittsburgh', dropoff_latitude=40.4, dropoff_longitude=-80.0,
+            current_cycle_used=10,
+        )
+        fields.update(overrides)
+        return Trip.objects.create(user=user or self.user, **fields)
+
+    def post_batch(self, data):
+        return self.client.post('/api/trip-details/batch/', data, format='json')
+
+    def test_shared_routes_are_fetched_once(self):
+        with mock.patch.object(routing, 'get_route_legs', wraps=routing.get_route_legs) as get_route_legs:
+            response = self.post_batch({'trip_ids': [trip.id for trip in self.trips]})
+            lines = parse_ndjson(response)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(get_route_legs.call_count, 2)
+        self.assertEqual(sorted(line['trip_id'] for line in lines), [trip.id for trip in self.trips])
+        self.assertEqual(TripEldLog.objects.count(), 4)
+
+    def test_matches_single_trip_details(self):
+        single = self.client.get(f'/api/trip-details/{self.trips[0].id}/').json()
+        TripEldLog.objects.all().delete()
+
+        lines = parse_ndjson(self.post_batch({'trip_ids': [self.trips[0].id]}))
+
+        self.assertEqual(lines[0]['daily_summaries'], single['daily_summaries'])
+
+    def test_stored_logs_skip_routing(self):
+        parse_ndjson(self.post_batch({}))
+        with mock.patch.object(routing, 'get_route_legs') as get_route_legs:
+            lines = parse_ndjson(self.post_batch({}))
+
+        get_route_legs.assert_not_called()
+        self.assertEqual(len(lines), 4)
+
+    def test_other_users_trips_are_not_found(self):
+        other = CustomUser.objects.create_user(username='other', password='secret')
+        foreign = self.create_trip(user=other)
+
+        lines = parse_ndjson(self.post_batch({'trip_ids': [foreign.id, self.trips[0].id]}))
+
+        self.assertIn({'trip_id': foreign.id, 'error': 'Trip not found'}, lines)
+        self.assertEqual(len(lines), 2)
+
+    def test_created_filter(self):
+        Trip.objects.filter(id=self.trips[0].id).update(created_at=timezone.now() - timedelta(days=2))
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+
+        lines = parse_ndjson(self.post_batch({'created_after': since}))
+
+        self.assertEqual(len(lines), 3)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.post_batch({'trip_ids': 'all'}).status_code, 400)
+        self.assertEqual(self.post_batch({'created_after': 'yesterday'}).status_code, 400)
+        with override_settings(BATCH_MAX_TRIPS=3):
+            self.assertEqual(self.post_batch({}).status_code, 400)
+
+    @override_settings(BATCH_PLAN_WORKERS=1)
+    def test_process_pool(self):
+        lines = parse_ndjson(self.post_batch({'trip_ids': [self.trips[0].id, self.trips[1].id]}))
+
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(all('daily_summaries' in line for line in lines))
+
+
+class PolylineTests(SimpleTestCase):
+    def test_encoding_round_trips_and_simplifies(self):
+        points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+        self.assertEqual(encode_polyline(points), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(decode_polyline(encode_polyline(points)), points)
+
+        line = [(40.0 + index * 0.001, -75.0 + (0.00001 if index % 2 else 0)) for index in range(1000)]
+        self.assertEqual(simplify_polyline(line, 0.0001), [line[0], line[-1]])
+        self.assertEqual(simplify_polyline(line, 0), line)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def test_only_marked_trip_reads_use_the_replica(self):
+        router = ReplicaRouter()
+        with mock.patch.dict(settings.DATABASES, {'replica': settings.DATABASES['default']}):
+            self.assertIsNone(router.db_for_read(Trip))
+            with replica_reads():
+                self.assertEqual(router.db_for_read(Trip), 'replica')
+                self.assertEqual(router.db_for_read(TripEldLog), 'replica')
+                self.assertIsNone(router.db_for_read(RouteCacheEntry))
+                self.assertEqual(router.db_for_write(Trip), 'default')
+            self.assertFalse(router.allow_migrate('replica', 'api'))
+
+        with replica_reads():
+            self.assertIsNone(router.db_for_read(Trip))
+
+
+@override_settings(ROUTING_PROVIDER={'BACKEND': 'api.routing.GreatCircleProvider', 'OPTIONS': {'step_miles': 10}})
+class GreatCircleProviderTests(TestCase):
+    def test_routes_offline_without_caching(self):
+        legs = routing.get_route_legs([(40.0, -75.0), (40.3, -76.9), (40.4, -80.0)])
+
+        self.assertEqual(len(legs), 2)
+        self.assertFalse(RouteCacheEntry.objects.exists())
+        # Philadelphia -> Harrisburg is ~100 miles as the crow flies
+        self.assertAlmostEqual(legs[0]['total_distance'], 103 * 1.25, delta=5)
+        self.assertAlmostEqual(sum(step['distance'] for step in legs[0]['steps']), legs[0]['total_distance'])
+        self.assertEqual(legs[1]['steps'][-1]['end_location'], {'lat': 40.4, 'lon': -80.0})
+        self.assertEqual(legs[0]['steps'][-1]['end_location'], legs[1]['steps'][0]['start_location'])
+
+    def test_incomplete_provider_fails_when_built(self):
+        class RouteOnlyProvider(routing.RoutingProvider):
+            def route_legs(self, waypoints):
+                return make_legs(waypoints)
+
+        with override_settings(ROUTING_PROVIDER={'BACKEND': 'api.routing.RoutingProvider', 'OPTIONS': {}}):
+            with self.assertRaises(TypeError):
+                routing.get_routing_provider()
+        with self.assertRaises(TypeError):
+            RouteOnlyProvider()
+
+
+@override_settings(HTTP_BACKOFF=0, HTTP_MAX_RETRIES=1, HTTP_READ_TIMEOUT=0.5)
+class HttpClientTests(SimpleTestCase):
+    def setUp(self):
+        http_client.reset_clients()
+        self.upstream = FakeUpstream().start()
+        self.addCleanup(self.upstream.stop)
+        self.url = self.upstream.url + '/reverse?lat=1&lon=2'
+
+    def test_transient_failure_is_retried(self):
+        self.upstream.fail_next(1)
+        response = http_client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.upstream.request_count, 2)
+
+    def test_slow_upstream_times_out(self):
+        self.upstream.latency = 1
+        with self.assertRaises(requests.exceptions.Timeout):
+            http_client.get(self.url)
+
+    @override_settings(HTTP_CIRCUIT_FAILURES=2, HTTP_MAX_RETRIES=0)
+    def test_circuit_opens_after_repeated_failures(self):
+        self.upstream.fail_next(10)
+        http_client.get(self.url)
+        http_client.get(self.url)
+        with self.assertRaises(http_client.CircuitOpenError):
+            http_client.get(self.url)
+
+        self.assertEqual(self.upstream.request_count, 2)
+
+
+class FakeUpstreamViewTests(TestCase):
+    def setUp(self):
+        http_client.reset_clients()
+        self.upstream = FakeUpstream().start()
+        self.addCleanup(self.upstream.stop)
+        self.user = CustomUser.objects.create_user(username='driver', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_get_route_uses_configured_osrm(self):
+        with override_settings(OSRM_URL=self.upstream.url):
+            route = routing.get_route(40.0, -75.0, 40.4, -80.0)
+
+        self.assertEqual(len(route['steps']), 11)
+        self.assertAlmostEqual(sum(step['distance'] for step in route['steps']), route['total_distance'])
+
+    def test_route_table_comes_from_osrm_once(self):
+        points = [(40.0, -75.0), (40.4, -80.0), (40.0, -83.0)]
+        with override_settings(OSRM_URL=self.upstream.url):
+            table = routing.get_route_table(points)
+            self.assertEqual(routing.get_route_table(points), table)
+
+        self.assertEqual(self.upstream.request_count, 1)
+        self.assertEqual(table['durations'][1][1], 0)
+        self.assertGreater(table['distances'][0][2], table['distances'][0][1])
+
+    def test_trip_details_routes_all_legs_in_one_request(self):
+        trip = Trip.objects.create(
+            user=self.user,
+            current_location='Philadelphia', current_latitude=40.0, current_longitude=-75.0,
+            pickup_location='Harrisburg', pickup_latitude=40.3, pickup_longitude=-76.9,
+            dropoff_location='Pittsburgh', dropoff_latitude=40.4, dropoff_longitude=-80.0,
+            current_cycle_used=10,
+        )
+        with override_settings(OSRM_URL=self.upstream.url):
+            data = self.client.get(f'/api/trip-details/{trip.id}/').json()
+
+        self.assertEqual(self.upstream.request_count, 1)
+        notes = [log['notes'] for day in data['daily_summaries'] for log in day['logs']]
+        self.assertIn('Drive to Pickup', notes)
+        self.assertIn('Drive to Dropoff', notes)
+
+    def test_trip_route_serves_stored_polyline_with_etag(self):
+        trip = Trip.objects.create(
+            user=self.user,
+            current_location='Philadelphia', current_latitude=40.0, current_longitude=-75.0,
+            pickup_location='Harrisburg', pickup_latitude=40.3, pickup_longitude=-76.9,
+            dropoff_location='Pittsburgh', dropoff_latitude=40.4, dropoff_longitude=-80.0,
+            current_cycle_used=10,
+        )
+        with override_settings(OSRM_URL=self.upstream.url):
+            full = self.client.get(f'/api/trips/{trip.id}/route/')
+            coarse = self.client.get(f'/api/trips/{trip.id}/route/', {'zoom': 5})
+            with self.assertNumQueries(1):
+                cached = self.client.get(f'/api/trips/{trip.id}/route/', HTTP_IF_NONE_MATCH=full['ETag'])
+            other = APIClient()
+            other.force_authenticate(CustomUser.objects.create_user(username='other', password='secret'))
+            foreign = other.get(f'/api/trips/{trip.id}/route/', HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(self.upstream.request_count, 1)
+        points = decode_polyline(full.json()['polyline'])
+        self.assertEqual((points[0], points[-1]), ((40.0, -75.0), (40.4, -80.0)))
+        self.assertIn((40.3, -76.9), points)
+        self.assertEqual(coarse.json()['level'], '5')
+        self.assertLess(len(decode_polyline(coarse.json()['polyline'])), len(points))
+        self.assertNotEqual(coarse['ETag'], full['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['Cache-Control'], full['Cache-Control'])
+        self.assertEqual(foreign.status_code, 404)
+
+    def test_trip_details_reports_server_timing_and_metrics(self):
+        trip = Trip.objects.create(
+            user=self.user,
+            current_location='Philadelphia', current_latitude=40.0, current_longitude=-75.0,
+            pickup_location='Harrisburg', pickup_latitude=40.3, pickup_longitude=-76.9,
+            dropoff_location='Pittsburgh', dropoff_latitude=40.4, dropoff_longitude=-80.0,
+            current_cycle_used=10,
+        )
+        self.assertNotIn('Server-Timing', self.client.get('/api/trips/'))
+        with override_settings(OSRM_URL=self.upstream.url, SERVER_TIMING_HEADER=True):
+            response = self.client.get(f'/api/trip-details/{trip.id}/')
+
+        timing = response['Server-Timing']
+        host = self.upstream.url.split('//')[1]
+        for entry in ('db;', 'route;', 'engine;', 'trip;', 'http;dur=', f'desc="{host}"', 'total;dur='):
+            self.assertIn(entry, timing)
+
+        with override_settings(METRICS_TOKEN='scrape'):
+            metrics = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(metrics.status_code, 200)
+        self.assertIn('routelog_requests_total{status="200",view="trip-details"}', metrics.content.decode())
+        self.assertIn(f'routelog_span_calls_total{{span="http",target="{host}"}}', metrics.content.decode())
+
+    def test_metrics_are_off_by_default(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='127.0.0.1').status_code, 403)
+        with override_settings(METRICS_TOKEN='scrape'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+    @override_settings(HTTP_BACKOFF=0, HTTP_MAX_RETRIES=0)
+    def test_reverse_geocode_falls_back_to_nominatim(self):
+        self.upstream.fail_next(1)
+        with override_settings(GEOCODE_URL=self.upstream.url + '/reverse', NOMINATIM_URL=self.upstream.url + '/reverse'):
+            response = self.client.get('/api/reverse-geocode/', {'lat': 40.0, 'lon': -75.0})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Fake City 40.00,-75.00')
+        self.assertEqual(self.upstream.request_count, 2)
+
+
+@override_settings(HTTP_BACKOFF=0, HTTP_MAX_RETRIES=0)
+class GeocodeCacheTests(TestCase):
+    def setUp(self):
+        http_client.reset_clients()
+        self.upstream = FakeUpstream().start()
+        self.addCleanup(self.upstream.stop)
+        self.user = CustomUser.objects.create_user(username='driver', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        urls = override_settings(GEOCODE_URL=self.upstream.url + '/reverse', NOMINATIM_URL=self.upstream.url + '/reverse')
+        urls.enable()
+        self.addCleanup(urls.disable)
+
+    def reverse(self, lat, lon):
+        return self.client.get('/api/reverse-geocode/', {'lat': lat, 'lon': lon})
+
+    def test_geohash(self):
+        self.assertEqual(geohash_encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_nearby_points_share_a_lookup(self):
+        first = self.reverse(40.00001, -75.00001)
+        second = self.reverse(40.00003, -75.00004)
+
+        self.assertEqual(self.upstream.request_count, 1)
+        self.assertEqual(first.json()['name'], second.json()['name'])
+        self.assertEqual(second.json()['lat'], 40.00003)
+        self.assertEqual(CacheCounter.objects.get(name='geocode').hits, 1)
+
+    def test_expired_entries_are_refetched(self):
+        self.reverse(40.0, -75.0)
+        GeocodeCacheEntry.objects.update(created_at=timezone.now() - timedelta(days=365))
+        self.reverse(40.0, -75.0)
+
+        self.assertEqual(self.upstream.request_count, 2)
+
+    @override_settings(GEOCODE_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_entries_are_evicted(self):
+        self.reverse(40.0, -75.0)
+        self.reverse(41.0, -75.0)
+        self.reverse(40.0, -75.0)
+        self.reverse(42.0, -75.0)
+
+        self.assertEqual(GeocodeCacheEntry.objects.count(), 2)
+        self.assertFalse(GeocodeCacheEntry.objects.filter(geohash=geocode_cache_key(41.0, -75.0)).exists())
+
+    def test_local_only_mode_never_calls_upstream(self):
+        self.reverse(40.0, -75.0)
+        with override_settings(GEOCODE_LOCAL_ONLY=True):
+            cached = self.reverse(40.0, -75.0)
+            missing = self.reverse(45.0, -75.0)
+
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(self.upstream.request_count, 1)
+
+    def reverse_batch(self, points):
+        coordinates = [{'lat': lat, 'lon': lon} for lat, lon in points]
+        return self.client.post('/api/reverse-geocode/batch/', {'coordinates': coordinates}, format='json')
+
+    def test_batch_deduplicates_and_keeps_order(self):
+        self.reverse(41.0, -75.0)
+        response = self.reverse_batch([(40.00001, -75.00001), (41.0, -75.0), (40.00003, -75.00004), (42.0, -75.0)])
+
+        names = [result['name'] for result in response.json()['results']]
+        self.assertEqual(names, ['Fake City 40.00,-75.00', 'Fake City 41.00,-75.00', 'Fake City 40.00,-75.00', 'Fake City 42.00,-75.00'])
+        self.assertEqual(self.upstream.request_count, 3)
+
+    def test_batch_reports_failed_points(self):
+        self.upstream.fail_next(2)
+        results = self.reverse_batch([(40.0, -75.0)]).json()['results']
+
+        self.assertIn('error', results[0])
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+
+    @override_settings(GEOCODE_MAX_CONCURRENCY=2)
+    def test_batch_bounds_concurrent_lookups(self):
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def slow_lookup(lat, lon):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            return {'address': {'city': 'Somewhere'}}
+
+        with mock.patch.object(geocoding, 'request_reverse_geocode', side_effect=slow_lookup):
+            response = self.reverse_batch([(40.0 + index, -75.0) for index in range(8)])
+
+        self.assertEqual(len(response.json()['results']), 8)
+        self.assertEqual(in_flight[1], 2)
+
+    @override_settings(GEOCODE_MAX_CONCURRENCY=2)
+    def test_async_lookups_are_bounded(self):
+        in_flight = [0, 0]
+
+        async def slow_lookup(lat, lon):
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+            await asyncio.sleep(0.02)
+            in_flight[0] -= 1
+            return {'address': {'city': 'Somewhere'}}
+
+        async def lookup_all():
+            return await asyncio.gather(*(geocoding.afetch_reverse_geocode(40.0 + index, -75.0) for index in range(8)))
+
+        with mock.patch.object(geocoding, 'arequest_reverse_geocode', side_effect=slow_lookup):
+            results = asyncio.run(lookup_all())
+
+        self.assertEqual(len(results), 8)
+        self.assertEqual(in_flight[1], 2)
+
+    def test_trip_details_resolve_names(self):
+        trip = Trip.objects.create(
+            user=self.user,
+            current_location='Philadelphia', current_latitude=40.0, current_longitude=-75.0,
+            pickup_location='Harrisburg', pickup_latitude=40.3, pickup_longitude=-76.9,
+            dropoff_location='Pittsburgh', dropoff_latitude=40.4, dropoff_longitude=-80.0,
+            current_cycle_used=10,
+        )
+        with mock.patch.object(routing, 'get_route_legs', side_effect=make_legs):
+            plain = self.client.get(f'/api/trip-details/{trip.id}/').json()
+            resolved = self.client.get(f'/api/trip-details/{trip.id}/', {'resolve_names': 'true'}).json()
+
+        plain_names = {log['location']['name'] for day in plain['daily_summaries'] for log in day['logs']}
+        resolved_names = {log['location']['name'] for day in resolved['daily_summaries'] for log in day['logs']}
+        self.assertIn('Location at 40.0000, -75.0000', plain_names)
+        self.assertIn('Fake City 40.00,-75.00', resolved_names)
+        self.assertIn('Pittsburgh', resolved_names)
+        self.assertFalse(any(name.startswith('Location at') for name in resolved_names))
+        # Stored logs keep the engine's placeholders
+        self.assertEqual(TripEldLog.objects.get(trip=trip).data, plain)
+
+    @override_settings(GEOCODE_BATCH_MAX_POINTS=2)
+    def test_resolved_names_are_capped(self):
+        eld_data = {'daily_summaries': [{'logs': [
+            {'location': {'lat': lat, 'lon': -75.0, 'name': f'Location at {lat:.4f}, -75.0000'}}
+            for lat in (40.0, 41.0, 40.0, 42.0, 43.0)
+        ]}]}
+
+        resolved = geocoding.resolve_log_location_names(eld_data)
+
+        self.assertEqual(self.upstream.request_count, 2)
+        names = [log['location']['name'] for log in resolved['daily_summaries'][0]['logs']]
+        self.assertEqual(names[3:], ['Location at 42.0000, -75.0000', 'Location at 43.0000, -75.0000'])
+        self.assertFalse(any(name.startswith('Location at') for name in names[:3]))
+
+
+class GazetteerTests(SimpleTestCase):
+    def test_names_points_relative_to_nearest_place(self):
+        gazetteer = eld.Gazetteer()
+
+        self.assertEqual(gazetteer.name(40.2732, -76.8867), 'Harrisburg, PA')
+        self.assertEqual(gazetteer.name(40.45, -76.6), '19 mi NE of Harrisburg, PA')
+        self.assertIsNone(gazetteer.name(45.0, -40.0))
+
+    def test_custom_gazetteer_survives_pickling(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('name,region,country,latitude,longitude\nTestville,ZZ,US,10.0,10.0\n')
+        self.addCleanup(os.unlink, f.name)
+        gazetteer = pickle.loads(pickle.dumps(eld.Gazetteer(f.name, max_miles=10)))
+
+        self.assertEqual(gazetteer.name(10.0, 10.0), 'Testville, ZZ')
+        self.assertIsNone(gazetteer.name(10.5, 10.0))
+
+    def test_plan_names_stops_offline(self):
+        trip = {
+            'id': 1,
+            'current_latitude': 40.7128, 'current_longitude': -74.0060,
+            'pickup_latitude': 41.8781, 'pickup_longitude': -87.6298, 'pickup_location': 'Chicago',
+            'dropoff_latitude': 39.7392, 'dropoff_longitude': -104.9903, 'dropoff_location': 'Denver',
+            'accumulated_weekly_hours': 0,
+        }
+        waypoints = [(40.7128, -74.0060), (41.8781, -87.6298), (39.7392, -104.9903)]
+        legs = routing.GreatCircleProvider().route_legs(waypoints)
+        plain = eld.plan_trip_dict(trip, copy.deepcopy(legs), datetime(2025, 1, 6, 6, 30))
+        named = eld.plan_trip_dict(trip, copy.deepcopy(legs), datetime(2025, 1, 6, 6, 30), eld.Gazetteer())
+
+        logs = [log for day in named['daily_summaries'] for log in day['logs']]
+        self.assertEqual(logs[0]['location']['name'], 'New York, NY')
+        self.assertFalse(any(log['location']['name'].startswith('Location at') for log in logs))
+        # Only the names change
+        for day in plain['daily_summaries'] + named['daily_summaries']:
+            for log in day['logs']:
+                del log['location']['name']
+        self.assertEqual(plain, named)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        http_client.reset_clients()
+        self.upstream = FakeUpstream().start()
+        self.addCleanup(self.upstream.stop)
+        self.user = CustomUser.objects.create_user(username='driver', password='secret')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.trip = Trip.objects.create(
+            user=self.user,
+            current_location='Philadelphia', current_latitude=40.0, current_longitude=-75.0,
+            pickup_location='Harrisburg', pickup_latitude=40.3, pickup_longitude=-76.9,
+            dropoff_location='Pittsburgh', dropoff_latitude=40.4, dropoff_longitude=-80.0,
+            current_cycle_used=10,
+        )
+
+    def test_trip_details_async_matches_sync(self):
+        with override_settings(OSRM_URL=self.upstream.url):
+            async_data = self.client.get(f'/api/trip-details/{self.trip.id}/async/').json()
+            TripEldLog.objects.all().delete()
+            sync_data = self.client.get(f'/api/trip-details/{self.trip.id}/').json()
+
+        self.assertEqual(async_data['daily_summaries'], sync_data['daily_summaries'])
+        self.assertEqual(self.upstream.request_count, 1)
+        self.assertTrue(TripEldLog.objects.exists())
+
+    @override_settings(HTTP_BACKOFF=0, HTTP_MAX_RETRIES=0)
+    def test_legs_are_fetched_concurrently_after_failure(self):
+        self.upstream.fail_next(1)
+        with override_settings(OSRM_URL=self.upstream.url):
+            data = self.client.get(f'/api/trip-details/{self.trip.id}/async/').json()
+
+        self.assertEqual(self.upstream.request_count, 3)
+        notes = [log['notes'] for day in data['daily_summaries'] for log in day['logs']]
+        self.assertIn('Drive to Dropoff', notes)
+
+    @override_settings(HTTP_BACKOFF=0, HTTP_MAX_RETRIES=0)
+    def test_reverse_geocode_async_falls_back_to_nominatim(self):
+        self.upstream.fail_next(1)
+        with override_settings(GEOCODE_URL=self.upstream.url + '/reverse', NOMINATIM_URL=self.upstream.url + '/reverse'):
+            response = self.client.get('/api/reverse-geocode/async/', {'lat': 40.0, 'lon': -75.0})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Fake City 40.00,-75.00')
+
+    def test_async_views_require_authentication(self):
+        client = APIClient()
+        self.assertEqual(client.get(f'/api/trip-details/{self.trip.id}/async/').status_code, 401)
+        self.assertEqual(client.get('/api/reverse-geocode/async/', {'lat': 40.0, 'lon': -75.0}).status_code, 401)
+
+        other = CustomUser.objects.create_user(username='other', password='secret')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        self.assertEqual(client.get(f'/api/trip-details/{self.trip.id}/async/').status_code, 403)
+
+
+def make_synthetic_legs(waypoints, step_count, seed):
+    """
+    Legs with step_count irregular steps each, including some negligible ones
+    """
+    rng = random.Random(seed)
+    legs = []
+    for (start_lat, start_lon), (end_lat, end_lon) in zip(waypoints, waypoints[1:]):
+        steps = []
+        for index in range(step_count):
+            distance = rng.choice([0.05, rng.uniform(0.1, 2), rng.uniform(2, 60)])
+            start_fraction, end_fraction = index / step_count, (index + 1) / step_count
+            steps.append({
+                'distance': distance,
+                'duration': distance / rng.uniform(25, 70),
+                'name': f'Road {index}',
+                'start_location': {
+                    'lat': start_lat + start_fraction * (end_lat - start_lat),
+                    'lon': start_lon + start_fraction * (end_lon - start_lon),
+                },
+                'end_location': {
+                    'lat': start_lat + end_fraction * (end_lat - start_lat),
+                    'lon': start_lon + end_fraction * (end_lon - start_lon),
+                },
+            })
+        legs.append({
+            'total_distance': sum(step['distance'] for step in steps),
+            'total_duration': sum(step['duration'] for step in steps),
+            'steps': steps,
+        })
+    return legs
+
+
+class StepSearchEquivalenceTests(SimpleTestCase):
+    trip = {
+        'id': 1,
+        'current_latitude': 40.0, 'current_longitude': -75.0, 'current_location': 'Philadelphia',
+        'pickup_latitude': 40.3, 'pickup_longitude': -76.9, 'pickup_location': 'Harrisburg',
+        'dropoff_latitude': 34.0, 'dropoff_longitude': -118.2, 'dropoff_location': 'Los Angeles',
+    }
+
+    def assertSameLogs(self, trip, legs):
+        expected = reference_eld_logs(trip, legs)
+        with mock.patch.object(routing, 'get_route_legs', side_effect=lambda waypoints: copy.deepcopy(legs)):
+            actual = planning.calculate_eld_logs(trip)
+
+        self.assertEqual(actual['total_days'], expected['total_days'])
+        # The step walk rounds every step to whole microseconds. Once that drift lands a time
+        # just before or after a whole second, splitting at 23:59:59 carries it into the next
+        # day as a full second, so allow up to a second per day.
+        time_tolerance = actual['total_days']
+        self.assertAlmostEqual(actual['total_miles'], expected['total_miles'], places=6)
+        self.assertEqual([day['date'] for day in actual['daily_summaries']], [day['date'] for day in expected['daily_summaries']])
+        actual_logs = [log for day in actual['daily_summaries'] for log in day['logs']]
+        expected_logs = [log for day in expected['daily_summaries'] for log in day['logs']]
+        self.assertEqual(len(actual_logs), len(expected_logs))
+        for actual_log, expected_log in zip(actual_logs, expected_logs):
+            self.assertEqual(
+                (actual_log['status'], actual_log['notes'], actual_log['location']['name']),
+                (expected_log['status'], expected_log['notes'], expected_log['location']['name']),
+            )
+            self.assertAlmostEqual(actual_log['duration'], expected_log['duration'], delta=time_tolerance / 3600 + 1e-9)
+            self.assertAlmostEqual(actual_log['miles'], expected_log['miles'], places=6)
+            for field in ['start_time', 'end_time']:
+                drift = datetime.fromisoformat(actual_log[field]) - datetime.fromisoformat(expected_log[field])
+                self.assertLessEqual(abs(drift.total_seconds()), time_tolerance)
+
+    def test_mid_step_stops_follow_the_step_geometry(self):
+        # One 16 hour step that bends north through (41, -76) on its way from (40, -75) to (40, -77)
+        step = {
+            'distance': 800.0, 'duration': 16.0, 'name': 'Bent Road',
+            'start_location': {'lat': 40.0, 'lon': -75.0},
+            'end_location': {'lat': 40.0, 'lon': -77.0},
+            'geometry': encode_polyline([(40.0, -75.0), (41.0, -76.0), (40.0, -77.0)]),
+        }
+        trip = {
+            **self.trip, 'accumulated_weekly_hours': 0,
+            'pickup_latitude': 40.0, 'pickup_longitude': -77.0,
+        }
+        legs = [{'total_distance': 800.0, 'total_duration': 16.0, 'steps': [step]}, make_route(40.0, -77.0, 34.0, -118.2)]
+
+        logs = [log for day in eld.plan_trip_dict(trip, legs)['daily_summaries'] for log in day['logs']]
+        stop = next(log for log in logs if log['notes'] == '30-min break')
+        # Eight of sixteen hours in is the bend, not the straight-line midpoint (40, -76)
+        self.assertAlmostEqual(stop['location']['lat'], 41.0, places=1)
+        self.assertAlmostEqual(stop['location']['lon'], -76.0, places=1)
+
+    def test_mid_step_stops_follow_node_durations(self):
+        # Same bent step, but the first half is driven in 2 hours and the second in 14
+        geometry = encode_polyline([(40.0, -75.0), (41.0, -76.0), (40.0, -77.0)])
+        osrm_leg = {
+            'distance': 800 * METERS_PER_MILE, 'duration': 16 * 3600,
+            'steps': [
+                {'distance': 800 * METERS_PER_MILE, 'duration': 16 * 3600, 'name': 'Bent Road',
+                 'maneuver': {'location': [-75.0, 40.0]}, 'geometry': geometry},
+                {'distance': 0, 'duration': 0, 'name': 'Bent Road',
+                 'maneuver': {'location': [-77.0, 40.0]}, 'geometry': encode_polyline([(40.0, -77.0)] * 2)},
+            ],
+            'annotation': {'duration': [2 * 3600, 14 * 3600]},
+        }
+        leg = routing.structure_leg(osrm_leg, 40.0, -77.0)
+        self.assertEqual(leg['steps'][0]['node_durations'], [2.0, 14.0])
+        self.assertNotIn('node_durations', leg['steps'][1])
+
+        trip = {
+            **self.trip, 'accumulated_weekly_hours': 0,
+            'pickup_latitude': 40.0, 'pickup_longitude': -77.0,
+        }
+        legs = [leg, make_route(40.0, -77.0, 34.0, -118.2)]
+        logs = [log for day in eld.plan_trip_dict(trip, legs)['daily_summaries'] for log in day['logs']]
+        stop = next(log for log in logs if log['notes'] == '30-min break')
+        # Eight hours in is 6 of the 14 hours past the bend
+        self.assertAlmostEqual(stop['location']['lat'], 41.0 - 6 / 14, places=2)
+        self.assertAlmostEqual(stop['location']['lon'], -76.0 - 6 / 14, places=2)
+
+    def test_matches_step_walk(self):
+        waypoints = [(40.0, -75.0), (40.3, -76.9), (34.0, -118.2)]
+        for step_count, seed, cycle_used in [(1, 1, 0), (10, 2, 0), (200, 3, 10), (2000, 4, 40), (5000, 5, 68)]:
+            with self.subTest(step_count=step_count, cycle_used=cycle_used):
+                trip = {**self.trip, 'accumulated_weekly_hours': cycle_used}
+                self.assertSameLogs(trip, make_synthetic_legs(waypoints, step_count, seed))
+
+    def test_matches_step_walk_with_uniform_steps(self):
+        # Exactly representable step sizes land limit crossings exactly on step boundaries
+        legs = make_synthetic_legs([(40.0, -75.0), (40.3, -76.9), (34.0, -118.2)], 500, 6)
+        for leg in legs:
+            for step in leg['steps']:
+                step['distance'], step['duration'] = 5.0, 0.125
+        self.assertSameLogs({**self.trip, 'accumulated_weekly_hours': 0}, legs)
+
+    def test_engine_imports_without_django(self):
+        code = "import sys, api.eld; assert not any(name.startswith('django') for name in sys.modules)"
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, '-c', code], check=True, cwd=backend_dir)
+
+    def test_route_error_is_logged(self):
+        legs = make_synthetic_legs([(40.0, -75.0), (40.3, -76.9), (34.0, -118.2)], 10, 7)
+        plan = eld.plan_trip(self.trip, [ValueError('offline'), legs[1]]).to_dict()
+
+        notes = [log['notes'] for day in plan['daily_summaries'] for log in day['logs']]
+        self.assertIn('Error fetching route: offline', notes)
+        self.assertNotIn('Drive to Pickup', notes)
+        self.assertIn('Drive to Dropoff', notes)
+
+    def test_find_next_event_step(self):
+        durations = [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+        distances = [0.0, 10.0, 20.0, 30.0, 40.0, 50.0]
+
+        self.assertEqual(eld.find_next_event_step(durations, distances, 0, 100, [2.5], 100), 2)
+        self.assertEqual(eld.find_next_event_step(durations, distances, 1, 100, [0], 100), 5)
+        self.assertEqual(eld.find_next_event_step(durations, distances, 0, 3, [100], 100), 2)
+        self.assertEqual(eld.find_next_event_step(durations, distances, 0, 100, [100], 25), 2)
+
+
+def reference_location(lat, lon):
+    return {
+        "name": f"Location at {lat:.4f}, {lon:.4f}",
+        "lat": lat,
+        "lon": lon
+    }
+
+def reference_eld_logs(trip, legs):
+    """
+    calculate_eld_logs as it was before step searching, walking every route step
+    """
+    base_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    shift_start_time = base_date.replace(hour=6, minute=30, second=0)
+    
+    # Initialize current location from trip data
+    current_location = {
+        "lat": trip['current_latitude'],
+        "lon": trip['current_longitude'],
+        "name": f"Location at {trip['current_latitude']:.4f}, {trip['current_longitude']:.4f}"
+    }
+    
+    # Keep track of physical truck location separately from segment locations
+    truck_location = current_location.copy()
+    
+    eld_logs_by_day = {}
+    daily_log_key = shift_start_time.strftime("%Y-%m-%d")
+    eld_logs_by_day[daily_log_key] = []
+    
+    if shift_start_time.hour > 0 or shift_start_time.minute > 0 or shift_start_time.second > 0:
+        midnight = base_date
+        eld_logs_by_day[daily_log_key].append({
+            "status": eld.STATUS_OFF_DUTY,
+            "start_time": midnight.strftime("%Y-%m-%dT%H:%M:%S"),
+            "end_time": shift_start_time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration": (shift_start_time - midnight).total_seconds() / 3600,
+            "location": truck_location,  # Use truck's physical location
+            "miles": 0,
+            "notes": "Off duty - Before shift start"
+        })
+        # 30 minutes of pre-trip inspection
+        eld_logs_by_day[daily_log_key].append({
+            "status": eld.STATUS_ON_DUTY,
+            "start_time": shift_start_time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "end_time": (shift_start_time + timedelta(minutes=30)).strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration": 0.5,
+            "location": truck_location,  # Use truck's physical location
+            "miles": 0,
+            "notes": "Pre-trip /TIV"
+        })
+    
+
+    current_time = shift_start_time + timedelta(minutes=30)
+    
+    weekly_drive_hours = float(trip.get('accumulated_weekly_hours', 0))
+    daily_drive_hours = 0.0
+    daily_on_duty_hours = 0.0
+    drive_hours_since_break = 0.0
+    
+    # Define trip segments more precisely
+    pickup_location = {
+        "lat": trip['pickup_latitude'],
+        "lon": trip['pickup_longitude'],
+        "name": trip.get('pickup_location', f"Pickup at {trip['pickup_latitude']:.4f}, {trip['pickup_longitude']:.4f}")
+    }
+    
+    dropoff_location = {
+        "lat": trip['dropoff_latitude'],
+        "lon": trip['dropoff_longitude'],
+        "name": trip.get('dropoff_location', f"Dropoff at {trip['dropoff_latitude']:.4f}, {trip['dropoff_longitude']:.4f}")
+    }
+    
+    segments = [
+        {
+            "name": "Drive to Pickup",
+            "start": truck_location,  # Start from truck's current location, not segment start
+            "end": pickup_location,
+            "type": "drive_to_pickup"
+        },
+        {
+            "name": "Pickup Activity",
+            "start": pickup_location,
+            "end": pickup_location,
+            "type": "pickup"
+        },
+        {
+            "name": "Drive to Dropoff",
+            "start": pickup_location,
+            "end": dropoff_location,
+            "type": "drive_to_dropoff"
+        },
+        {
+            "name": "Dropoff Activity",
+            "start": dropoff_location,
+            "end": dropoff_location,
+            "type": "dropoff"
+        }
+    ]
+    
+    total_miles = 0.0
+    miles_since_fuel = 0.0
+    current_day = shift_start_time.date()
+    day_count = 1
+    destination_reached = False
+    
+    current_status = None
+    current_status_start = None
+    current_status_miles = 0.0
+    current_status_location = None
+    current_activity_type = None
+    current_status_notes = []
+    
+    def add_log_entry(status, start_time, end_time, location, miles, note):
+        # If location is null, use the last known location
+        if location is None and len(eld_logs_by_day) > 0:
+            # Try to find the most recent log entry with a valid location
+            for day_key in sorted(eld_logs_by_day.keys(), reverse=True):
+                for log in reversed(eld_logs_by_day[day_key]):
+                    if log["location"] is not None:
+                        location = log["location"]
+                        break
+                if location is not None:
+                    break
+        
+        # If still null, use truck's current location
+        if location is None:
+            location = truck_location
+        
+        duration = (end_time - start_time).total_seconds() / 3600
+        day_key = start_time.strftime("%Y-%m-%d")
+        end_day_key = end_time.strftime("%Y-%m-%d")
+        # for edge case here it is not possible for a log to reach the next day on max duty hours around 14 hours and day starts at 6:30
+        if day_key != end_day_key:
+            midnight = start_time.replace(hour=23, minute=59, second=59)
+            next_day = (midnight + timedelta(seconds=1)).replace(hour=0, minute=0, second=0)
+            
+            duration_first_day = (midnight - start_time).total_seconds() / 3600
+            
+            if day_key not in eld_logs_by_day:
+                eld_logs_by_day[day_key] = []
+            
+            eld_logs_by_day[day_key].append({
+                "status": status,
+                "start_time": start_time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "end_time": midnight.strftime("%Y-%m-%dT%H:%M:%S"),
+                "duration": duration_first_day,
+                "location": location,
+                "miles": miles * (duration_first_day / duration) if duration > 0 else 0,
+                "notes": note
+            })
+            
+            if end_day_key not in eld_logs_by_day:
+                eld_logs_by_day[end_day_key] = []
+            
+            eld_logs_by_day[end_day_key].append({
+                "status": status,
+                "start_time": next_day.strftime("%Y-%m-%dT%H:%M:%S"),
+                "end_time": end_time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "duration": duration - duration_first_day,
+                "location": location,
+                "miles": miles * ((duration - duration_first_day) / duration) if duration > 0 else 0,
+                "notes": note + " (continued from previous day)"
+            })
+        else:
+            if day_key not in eld_logs_by_day:
+                eld_logs_by_day[day_key] = []
+                
+            eld_logs_by_day[day_key].append({
+                "status": status,
+                "start_time": start_time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "end_time": end_time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "duration": duration,
+                "location": location,
+                "miles": miles,
+                "notes": note
+            })
+    
+    def flush_current_status():
+        nonlocal current_status, current_status_start, current_status_miles, current_status_location, current_status_notes, current_activity_type
+        
+        if current_status is not None:
+            note = current_status_notes[0] if current_status_notes else "Unknown activity" 
+            add_log_entry(
+                current_status, 
+                current_status_start, 
+                current_time, 
+                current_status_location, 
+                current_status_miles, 
+                note,
+            )
+            
+            current_status = None
+            current_status_start = None
+            current_status_miles = 0.0
+            current_status_location = None
+            current_status_notes = []
+            current_activity_type = None
+    
+    def handle_day_change(current_time):
+        nonlocal daily_drive_hours, daily_on_duty_hours, current_day, day_count
+        
+        flush_current_status()
+        
+        standard_start_time = current_time.replace(hour=6, minute=30, second=0) + timedelta(days=1)
+        # Add sleep period
+        rest_status = eld.STATUS_SLEEPER if not destination_reached else eld.STATUS_OFF_DUTY
+        rest_note = "Post-trip TIV/Overnight rest"
+        
+        # Use the location at the end of the day (truck's current location)
+        add_log_entry(
+            rest_status,
+            current_time,
+            standard_start_time,
+            truck_location,  # Use truck's current location
+            0,
+            rest_note
+        )
+        # 30 minutes of pre-trip inspection
+        add_log_entry(
+            eld.STATUS_ON_DUTY,
+            standard_start_time,
+            standard_start_time + timedelta(minutes=30),
+            truck_location,  # Use truck's current location
+            0,
+            "Pre-trip /TIV"
+        )
+        
+        daily_drive_hours = 0
+        daily_on_duty_hours = 0
+        current_day = standard_start_time.date()
+        day_count += 1
+        
+        return standard_start_time + timedelta(minutes=30)
+    
+    
+    
+    drive_segments = [segment for segment in segments if segment['type'] in ['drive_to_pickup', 'drive_to_dropoff']]
+    for segment, leg in zip(drive_segments, legs):
+        segment['route'] = copy.deepcopy(leg)
+
+    # Process each segment
+    for segment in segments:
+        # We don't update truck_location here - it will only be updated when actual driving occurs
+        
+        if segment['type'] in ['drive_to_pickup', 'drive_to_dropoff']:
+            activity_type = segment['type']
+            primary_note = segment['name']
+            
+            route = segment['route']
+
+            # If no steps are returned, create one step for the entire route
+            if not route['steps'] or len(route['steps']) == 0:
+                route['steps'] = [{
+                    'distance': route['total_distance'],
+                    'duration': route['total_duration'],
+                    'name': 'Direct Route',
+                    'start_location': {
+                        'lat': truck_location['lat'],  # Use truck's current location
+                        'lon': truck_location['lon']
+                    },
+                    'end_location': {
+                        'lat': segment['end']['lat'],
+                        'lon': segment['end']['lon']
+                    }
+                }]
+
+            for step_index, step in enumerate(route['steps']):
+                step_duration = step['duration']
+                step_distance = step['distance']
+                
+                # Skip steps with negligible duration or distance
+                if step_duration < 0.01 or step_distance < 0.1:
+                    continue
+                
+                # Hours and miles of this step still to drive; a stop or day change carries the rest over
+                left_duration, left_distance = step_duration, step_distance
+                while left_duration is not None:
+                    # Current location for the driving log is the truck's current location
+                    current_location = truck_location
+                
+                    # Calculate remaining time for each limit
+                    remaining_until_break = eld.MAX_DRIVE_HOURS_BEFORE_BREAK - drive_hours_since_break
+                    remaining_until_daily_limit = eld.MAX_DRIVE_HOURS_PER_DAY - daily_drive_hours
+                    remaining_until_weekly_limit = eld.MAX_WEEKLY_HOURS - weekly_drive_hours
+                
+                    # Calculate distance to fuel stop
+                    miles_to_fuel = eld.FUEL_STOP_DISTANCE - miles_since_fuel
+                    hours_to_fuel = (miles_to_fuel / left_distance) * left_duration if left_distance > 0 else float('inf')
+                
+                    # Determine which limit will be hit first
+                    limit_types = {
+                        "break": remaining_until_break if remaining_until_break > 0 else float('inf'),
+                        "daily": remaining_until_daily_limit if remaining_until_daily_limit > 0 else float('inf'),
+                        "weekly": remaining_until_weekly_limit if remaining_until_weekly_limit > 0 else float('inf'),
+                        "fuel": hours_to_fuel if hours_to_fuel > 0 else float('inf')
+                    }
+                
+                    # Find the minimum positive remaining time
+                    next_limit = min(limit_types.items(), key=lambda x: x[1])
+                    limit_type, remaining_time = next_limit
+
+                    # Check if day change will happen before the limit or the end of the step
+                    step_end_time = current_time + timedelta(hours=min(remaining_time, left_duration))
+                    if step_end_time.date() > current_day:
+                        current_time = handle_day_change(current_time)
+                        continue
+                
+                    # If any limit would be hit during this step
+                    if remaining_time < left_duration:
+                        # Calculate distance that can be covered in the remaining time
+                        remaining_distance = (remaining_time / left_duration) * left_distance
+                    
+                        # Finish current driving up to limit point
+                        if current_status == eld.STATUS_DRIVING:
+                            current_status_miles += remaining_distance
+                        else:
+                            flush_current_status()
+                            current_status = eld.STATUS_DRIVING
+                            current_status_start = current_time
+                            current_status_miles = remaining_distance
+                            current_status_location = truck_location
+                            current_status_notes = [primary_note]
+                            current_activity_type = activity_type
+                    
+                        total_miles += remaining_distance
+                        miles_since_fuel += remaining_distance
+                        daily_drive_hours += remaining_time
+                        daily_on_duty_hours += remaining_time
+                        weekly_drive_hours += remaining_time
+                        drive_hours_since_break += remaining_time
+                        current_time += timedelta(hours=remaining_time)
+                    
+                        # Update truck location to where limit is hit
+                        left_duration, left_distance = left_duration - remaining_time, left_distance - remaining_distance
+                        progress = 1 - left_duration / step_duration
+                        limit_lat = step['start_location']['lat'] + progress * (step['end_location']['lat'] - step['start_location']['lat'])
+                        limit_lon = step['start_location']['lon'] + progress * (step['end_location']['lon'] - step['start_location']['lon'])
+                        limit_location = reference_location(limit_lat, limit_lon)
+                        truck_location = limit_location  # Update truck_location to new physical location
+                    
+                        # Handle the specific limit that was hit
+                        flush_current_status()
+                    
+                        if limit_type == "break":
+                            # Add required break
+                            add_log_entry(
+                                eld.STATUS_OFF_DUTY,
+                                current_time,
+                                current_time + timedelta(minutes=30),
+                                truck_location,  # Use truck's current location
+                                0,
+                                "30-min break"
+                            )
+                            current_time += timedelta(minutes=30)
+                            daily_on_duty_hours += 0.5
+                            drive_hours_since_break = 0
+                        
+                        elif limit_type == "fuel":
+                            # Add fuel stop
+                            add_log_entry(
+                                eld.STATUS_ON_DUTY,
+                                current_time,
+                                current_time + timedelta(minutes=30),
+                                truck_location,  # Use truck's current location
+                                0,
+                                "Fuel stop"
+                            )
+                            current_time += timedelta(minutes=30)
+                            daily_on_duty_hours += 0.5
+                            miles_since_fuel = 0
+                        
+                        elif limit_type == "daily":
+                            # End the day
+                            current_time = handle_day_change(current_time)
+                            continue
+                        
+                        elif limit_type == "weekly":
+                            # Add 34-hour restart
+                            add_log_entry(
+                                eld.STATUS_OFF_DUTY,
+                                current_time,
+                                current_time + timedelta(hours=34),
+                                truck_location,  # Use truck's current location
+                                0,
+                                "34-hr restart period"
+                            )
+                            current_time += timedelta(hours=34)
+                            weekly_drive_hours = 0
+                            daily_drive_hours = 0
+                            daily_on_duty_hours = 0
+                            drive_hours_since_break = 0
+                            current_day = current_time.date()
+                            day_count += 1
+                    
+                        # Drive the rest of this step after the stop
+                        continue
+                
+                    # Normal driving for this step (no limits hit)
+                    if left_duration > 0:
+                        if current_status == eld.STATUS_DRIVING and current_activity_type == activity_type:
+                            # Continue current driving session
+                            current_status_miles += left_distance
+                        else:
+                            # Start a new driving session
+                            flush_current_status()
+                            current_status = eld.STATUS_DRIVING
+                            current_status_start = current_time
+                            current_status_miles = left_distance
+                            current_status_location = truck_location  # Use truck's current location
+                            current_status_notes = [primary_note]
+                            current_activity_type = activity_type
+                    
+                        total_miles += left_distance
+                        miles_since_fuel += left_distance
+                        daily_drive_hours += left_duration
+                        daily_on_duty_hours += left_duration
+                        weekly_drive_hours += left_duration
+                        drive_hours_since_break += left_duration
+                        current_time += timedelta(hours=left_duration)
+                    
+                        # Update truck location to the end of this step
+                        truck_location = reference_location(
+                            step['end_location']['lat'],
+                            step['end_location']['lon']
+                        )
+                    left_duration = None
+            
+            # After all steps, update truck_location to segment end
+            truck_location = {
+                "lat": segment['end']['lat'],
+                "lon": segment['end']['lon'],
+                "name": segment['end'].get('name', f"Location at {segment['end']['lat']:.4f}, {segment['end']['lon']:.4f}")
+            }
+            
+        elif segment['type'] in ['pickup', 'dropoff']:
+            # For stationary activities, use the truck's current location (it should already be at pickup/dropoff)
+            
+            # Add pickup/dropoff activity
+            flush_current_status()
+            
+            add_log_entry(
+                eld.STATUS_ON_DUTY,
+                current_time,
+                current_time + timedelta(minutes=eld.PICKUP_DROPOFF_TIME),
+                truck_location,  # Use truck's current location
+                0,
+                segment['name']
+            )
+            
+            current_time += timedelta(minutes=eld.PICKUP_DROPOFF_TIME)
+            daily_on_duty_hours += eld.PICKUP_DROPOFF_TIME / 60
+            
+            if segment['type'] == 'dropoff':
+                destination_reached = True
+    
+    # Add any remaining activity
+    flush_current_status()
+    
+    # Add off-duty period after destination is reached
+    if destination_reached:
+        midnight = current_time.replace(hour=23, minute=59, second=59)
+        
+        add_log_entry(
+            eld.STATUS_OFF_DUTY,
+            current_time,
+            midnight,
+            truck_location,  # Use truck's current location
+            0,
+            "Post-trip TIV-5mins/Off duty"
+        )
+    
+    # Generate summary
+    summary_by_day = {}
+    for day_key, logs in eld_logs_by_day.items():
+        summary_by_day[day_key] = {
+            "date": day_key,
+            "drive_hours": round(sum(log['duration'] for log in logs if log['status'] == eld.STATUS_DRIVING), 2),
+            "on_duty_hours": round(sum(log['duration'] for log in logs if log['status'] in [eld.STATUS_DRIVING, eld.STATUS_ON_DUTY]), 2),
+            "miles": round(sum(log['miles'] for log in logs), 2),
+            "logs": logs
+        }
+    
+    return {
+        "trip_id": trip.get('id', 'unknown'),
+        "start_time": shift_start_time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "end_time": current_time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "total_miles": round(total_miles, 2),
+        "total_drive_hours": round(sum(day_data["drive_hours"] for day_data in summary_by_day.values()), 2),
+        "total_on_duty_hours": round(sum(day_data["on_duty_hours"] for day_data in summary_by_day.values()), 2),
+        "total_days": day_count,
+        "daily_summaries": list(summary_by_day.values())
+    }
 
-# Create your tests here.
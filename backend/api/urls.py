@@ -3,7 +3,16 @@ from . import views
 
 urlpatterns = [
     path('trips/', views.TripViewSet.as_view({'get': 'list', 'post': 'create'}), name='trip-list'),
+    path('trips/nearby/', views.TripViewSet.as_view({'get': 'nearby'}), name='trip-nearby'),
     path('trips/<int:pk>/', views.TripViewSet.as_view({'get': 'retrieve', 'put': 'update', 'delete': 'destroy'}), name='trip-detail'),
+    path('trips/<int:pk>/route/', views.TripViewSet.as_view({'get': 'route'}), name='trip-route'),
     path('trip-details/<int:trip_id>/', views.trip_details, name='trip-details'),
+    path('trip-details/<int:trip_id>/stream/', views.trip_details_stream, name='trip-details-stream'),
+    path('trip-details/<int:trip_id>/async/', views.trip_details_async, name='trip-details-async'),
+    path('trip-details/<int:trip_id>/scenarios/', views.trip_scenarios, name='trip-details-scenarios'),
+    path('trip-details/batch/', views.batch_trip_details, name='trip-details-batch'),
     path('reverse-geocode/', views.reverse_coordinates, name='reverse-geocode'),
+    path('reverse-geocode/batch/', views.batch_reverse_coordinates, name='reverse-geocode-batch'),
+    path('reverse-geocode/async/', views.reverse_coordinates_async, name='reverse-geocode-async'),
+    path('cache-stats/', views.cache_stats, name='cache-stats'),
 ]
@@ -33,7 +33,7 @@ ALLOWED_HOSTS = ["*"]
 AUTH_USER_MODEL = 'api.CustomUser'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.StatelessReadJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -60,6 +60,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -143,7 +144,107 @@ CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_ALL_CREDENTIALS = True
 
 SECRET_KEY=os.getenv("SECRET_KEY")
+# Connections are kept for DB_CONN_MAX_AGE seconds and checked before reuse. The default 0 closes
+# them after every request; keep it at 0 under ASGI, where requests can run on different threads
+# and persistent connections are left open instead of being reused.
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", 0))
+DB_CONN_HEALTH_CHECKS = os.getenv("DB_CONN_HEALTH_CHECKS", "true").lower() in ("true", "1", "yes")
+
+
+def database_config(url):
+    if not url:
+        return {}
+    return dj_database_url.parse(
+        url,
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=DB_CONN_HEALTH_CHECKS,
+    )
+
+
 DATABASES = {
-    'default': dj_database_url.config(default=os.environ.get('DATABASE_URL'))
+    'default': database_config(os.environ.get('DATABASE_URL'))
 }
-GEOCODE_API_KEY=os.getenv("GEOCODE_API_KEY")
\ No newline at end of file
+
+# Optional read replica for trip reads (api.db_router); tests mirror it onto the default database
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = {**database_config(DATABASE_REPLICA_URL), 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+GEOCODE_API_KEY=os.getenv("GEOCODE_API_KEY")
+
+# Upstream services
+OSRM_URL = os.getenv("OSRM_URL", "http://router.project-osrm.org")
+GEOCODE_URL = os.getenv("GEOCODE_URL", "https://geocode.maps.co/reverse")
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/reverse")
+
+# Routing backend: api.routing.OSRMProvider (public or self-hosted OSRM at OSRM_URL)
+# or api.routing.GreatCircleProvider (offline distance estimate, no network)
+ROUTING_PROVIDER = {
+    "BACKEND": os.getenv("ROUTING_BACKEND", "api.routing.OSRMProvider"),
+    "OPTIONS": {},
+}
+
+# Outbound HTTP client (api/http_client.py)
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))  # Seconds
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10))  # Seconds
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 2))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", 0.3))  # Base backoff in seconds, doubled per retry
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 10))  # Kept-alive connections per host
+HTTP_CIRCUIT_FAILURES = int(os.getenv("HTTP_CIRCUIT_FAILURES", 5))  # Consecutive failures before opening
+HTTP_CIRCUIT_RESET = float(os.getenv("HTTP_CIRCUIT_RESET", 30))  # Seconds before a trial call
+
+# Route cache: waypoints are snapped to ROUTE_CACHE_PRECISION decimals (4 ~ 11 m) before lookup
+ROUTE_CACHE_TTL = int(os.getenv("ROUTE_CACHE_TTL", 7 * 24 * 60 * 60))  # Seconds
+ROUTE_CACHE_MAX_ENTRIES = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", 10000))
+ROUTE_CACHE_PRECISION = int(os.getenv("ROUTE_CACHE_PRECISION", 4))
+
+# Batch ELD planning (/api/trip-details/batch/)
+BATCH_MAX_TRIPS = int(os.getenv("BATCH_MAX_TRIPS", "500"))
+BATCH_ROUTE_WORKERS = int(os.getenv("BATCH_ROUTE_WORKERS", "8"))
+# Processes used to run the HOS engine, 0 (default) plans in the request thread. Each batch request
+# starts its own pool, which costs more than it saves unless batches are large
+BATCH_PLAN_WORKERS = int(os.getenv("BATCH_PLAN_WORKERS", "0"))
+
+# Reverse-geocode cache: points are bucketed into geohash cells of GEOCODE_CACHE_PRECISION characters
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", 30 * 24 * 60 * 60))  # Seconds
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", 50000))
+GEOCODE_CACHE_PRECISION = int(os.getenv("GEOCODE_CACHE_PRECISION", 7))  # ~150 m cells
+# Serve reverse geocodes from the cache only, never calling geocode.maps.co or Nominatim
+GEOCODE_LOCAL_ONLY = os.getenv("GEOCODE_LOCAL_ONLY", "False").lower() in ("true", "1", "yes")
+# Upper bound on concurrent upstream reverse-geocode lookups per process (bulk endpoint, resolve_names),
+# and separately per event loop for the async views
+GEOCODE_MAX_CONCURRENCY = int(os.getenv("GEOCODE_MAX_CONCURRENCY", 2))
+GEOCODE_BATCH_MAX_POINTS = int(os.getenv("GEOCODE_BATCH_MAX_POINTS", 500))
+
+# Offline place names for break, fuel and rest locations: "" (off), "bundled" or a path to a
+# name,region,country,latitude,longitude CSV. Stored ELD logs keep the names they were built
+# with, so clear TripEldLog after changing this.
+ELD_GAZETTEER = os.getenv("ELD_GAZETTEER", "")
+ELD_GAZETTEER_MAX_MILES = float(os.getenv("ELD_GAZETTEER_MAX_MILES", 100))
+
+# /api/trips/nearby/
+TRIPS_NEARBY_MAX_MILES = float(os.getenv("TRIPS_NEARBY_MAX_MILES", 500))
+TRIPS_NEARBY_LIMIT = int(os.getenv("TRIPS_NEARBY_LIMIT", 100))
+
+# What-if scenarios (/api/trip-details/<id>/scenarios/)
+SCENARIO_MAX_COUNT = int(os.getenv("SCENARIO_MAX_COUNT", 20))
+
+# Stop-order optimization (optimize_stops on trip create/update): solver time limit in seconds
+# and the most points sent in one routing table request (the public OSRM server allows 100)
+STOP_ORDER_TIME_BUDGET = float(os.getenv("STOP_ORDER_TIME_BUDGET", 0.25))
+STOP_ORDER_MAX_POINTS = int(os.getenv("STOP_ORDER_MAX_POINTS", 100))
+
+# Streamed trip_details (/api/trip-details/<id>/stream/) stores its result only for trips up to this many days
+ELD_STREAM_STORE_MAX_DAYS = int(os.getenv("ELD_STREAM_STORE_MAX_DAYS", 31))
+
+# Per-request timings (api.instrumentation): the Server-Timing response header shows every client
+# how long the database, routing and geocoding took, so it's off unless SERVER_TIMING_HEADER is set
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "false").lower() in ("true", "1", "yes")
+# /metrics is off unless one of these is set. Scrapers send "Authorization: Bearer <METRICS_TOKEN>",
+# or connect from a METRICS_ALLOWED_IPS address. REMOTE_ADDR is the proxy's address behind a reverse
+# proxy (every request then comes from 127.0.0.1), so only allow IPs when clients connect directly.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv("METRICS_ALLOWED_IPS", "").split(",") if ip.strip()]
+
+# Read requests trust the access token's user id claim instead of loading the user (api.authentication)
+JWT_STATELESS_READS = os.getenv("JWT_STATELESS_READS", "true").lower() in ("true", "1", "yes")
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.urls import path, include  # make sure 'include' is imported
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from api.views import RegisterView,GetUserView
+from api.views import RegisterView,GetUserView, metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -11,4 +11,5 @@ urlpatterns = [
     path('api/user/',GetUserView.as_view(), name='user'),
     path('api-auth/', include('rest_framework.urls')),
     path('api/', include('api.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
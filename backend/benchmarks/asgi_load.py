@@ -0,0 +1,167 @@
+"""
+Load test comparing trip_details under WSGI (gunicorn, sync worker) and the
+async variant under ASGI (uvicorn), one worker each, against a local fake OSRM
+with configurable latency.
+
+Every request plans a trip that has no stored logs or cached route, so each
+one pays the upstream latency. A sync worker serves one request at a time, the
+ASGI worker keeps many in flight while their route fetches are awaited.
+
+The default database is a temporary SQLite file. SQLite allows one writer at a
+time and fails concurrent read-then-write transactions with "database is
+locked", so under ASGI some requests can error out when storing their results;
+point --database-url at an empty PostgreSQL database for clean numbers.
+
+    python -m benchmarks.asgi_load --requests 200 --concurrency 50 --latency 0.2
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    "wsgi": (["-m", "gunicorn", "backend.wsgi:application", "--workers", "1", "--bind"], "/api/trip-details/{id}/"),
+    "asgi": (["-m", "uvicorn", "backend.asgi:application", "--workers", "1", "--log-level", "warning", "--port"], "/api/trip-details/{id}/async/"),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def start_server(kind, env):
+    args, _ = SERVERS[kind]
+    port = free_port()
+    bind = f"127.0.0.1:{port}" if kind == "wsgi" else str(port)
+    process = subprocess.Popen([sys.executable, *args, bind], cwd=BACKEND_DIR, env=env)
+    wait_for_port(port)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def create_trips(count):
+    """
+    One user and `count` trips with distinct pickups, so no two share a cached route
+    """
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from api.models import CustomUser, Trip
+
+    user = CustomUser.objects.create_user(username="loadtest", password="loadtest")
+    trips = Trip.objects.bulk_create([
+        Trip(
+            user=user,
+            current_location="Philadelphia", current_latitude=40.0, current_longitude=-75.0,
+            pickup_location="Harrisburg", pickup_latitude=round(40.3 + index * 0.001, 6), pickup_longitude=-76.9,
+            dropoff_location="Pittsburgh", dropoff_latitude=40.4, dropoff_longitude=-80.0,
+            current_cycle_used=10,
+        )
+        for index in range(count)
+    ])
+    return [trip.id for trip in trips], str(RefreshToken.for_user(user).access_token)
+
+
+def reset_stored_results():
+    from api.models import RouteCacheEntry, TripEldLog
+
+    TripEldLog.objects.all().delete()
+    RouteCacheEntry.objects.all().delete()
+
+
+def run_load(base_url, path, trip_ids, token, concurrency):
+    local = threading.local()
+
+    def fetch(trip_id):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+            session.headers["Authorization"] = f"Bearer {token}"
+        started = time.perf_counter()
+        response = session.get(base_url + path.format(id=trip_id), timeout=300)
+        return response.status_code, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, trip_ids))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    return {
+        "rps": len(results) / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "errors": sum(1 for status, _ in results if status != 200),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake OSRM latency in seconds")
+    parser.add_argument("--database-url", help="empty database to run against, defaults to a temporary SQLite file")
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=["wsgi", "asgi"])
+    options = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": "backend.settings",
+        # SQLite serializes writers; the timeout keeps concurrent ASGI requests waiting instead of failing
+        "DATABASE_URL": options.database_url or f"sqlite:///{workdir.name}/loadtest.db?timeout=30",
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "loadtest-secret-key-that-is-long-enough"),
+    }
+    os.environ.update(env)
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+
+    from api.fake_upstream import FakeUpstream
+
+    call_command("migrate", verbosity=0)
+    trip_ids, token = create_trips(options.requests)
+
+    with FakeUpstream(latency=options.latency) as upstream:
+        env["OSRM_URL"] = upstream.url
+        print(f"{options.requests} requests, concurrency {options.concurrency}, OSRM latency {options.latency * 1000:.0f} ms")
+        print(f"{'server':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+        for kind in options.servers:
+            reset_stored_results()
+            process, base_url = start_server(kind, env)
+            try:
+                result = run_load(base_url, SERVERS[kind][1], trip_ids, token, options.concurrency)
+            finally:
+                process.terminate()
+                process.wait()
+            print(f"{kind:>6} {result['rps']:>8.1f} {result['p50'] * 1000:>8.0f} "
+                  f"{result['p95'] * 1000:>8.0f} {result['errors']:>7}")
+
+    workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
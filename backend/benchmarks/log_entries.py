@@ -0,0 +1,55 @@
+"""
+Micro-benchmark for ELD log entry emission.
+
+Plans trips of growing length with the offline GreatCircleProvider and reports
+the time spent per emitted log entry, which should stay flat as trips grow.
+
+    python -m benchmarks.log_entries
+"""
+import os
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+django.setup()
+
+from django.test import override_settings  # noqa: E402
+
+from api.views import calculate_eld_logs  # noqa: E402
+
+# Road factors stretch the same ~800 mile trip from about a day to several months
+ROAD_FACTORS = [1, 4, 16, 64, 256]
+REPEATS = 5
+
+
+def make_trip():
+    return {
+        "id": "benchmark",
+        "current_latitude": 40.7128, "current_longitude": -74.0060, "current_location": "New York",
+        "pickup_latitude": 41.8781, "pickup_longitude": -87.6298, "pickup_location": "Chicago",
+        "dropoff_latitude": 39.7392, "dropoff_longitude": -104.9903, "dropoff_location": "Denver",
+        "accumulated_weekly_hours": 0,
+    }
+
+
+def run():
+    print(f"{'days':>6} {'entries':>8} {'total ms':>10} {'us/entry':>10}")
+    for road_factor in ROAD_FACTORS:
+        provider = {
+            "BACKEND": "api.routing.GreatCircleProvider",
+            "OPTIONS": {"road_factor": road_factor},
+        }
+        with override_settings(ROUTING_PROVIDER=provider):
+            best = float("inf")
+            for _ in range(REPEATS):
+                started = time.perf_counter()
+                result = calculate_eld_logs(make_trip())
+                best = min(best, time.perf_counter() - started)
+
+        entries = sum(len(day["logs"]) for day in result["daily_summaries"])
+        print(f"{result['total_days']:>6} {entries:>8} {best * 1000:>10.2f} {best / entries * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,297 @@
+"""
+Benchmark suite for the HOS engine and the trip endpoints, emitting JSON.
+
+  engine     plan_trip_dict on routes of 10 to 50k steps, with time, peak
+             memory (tracemalloc) and retained allocation counts per size
+  endpoints  trip_details (cold and stored), the trip list and
+             reverse_coordinates (cold and cached) end to end through Django,
+             against a local fake OSRM/geocoder on a temporary SQLite database
+
+Routes are OSRM-shaped responses from api.fake_upstream parsed by the real
+OSRMProvider, with every step stretched to STEP_MILES: the engine skips steps
+under 0.1 mi or 36 s, so more steps means a longer trip rather than finer
+slices of the same one. Pass --osrm-fixture with a saved OSRM /route response
+to tile its steps instead. Compare two runs with --compare.
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --output after.json
+    python -m benchmarks.suite --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+STEP_COUNTS = [10, 100, 1000, 10000, 50000]
+STEP_MILES = 1.0
+
+# New York -> Chicago -> Denver
+WAYPOINTS = [(40.7128, -74.0060), (41.8781, -87.6298), (39.7392, -104.9903)]
+
+
+def make_trip(trip_id="benchmark"):
+    (current_lat, current_lon), (pickup_lat, pickup_lon), (dropoff_lat, dropoff_lon) = WAYPOINTS
+    return {
+        "id": trip_id,
+        "current_latitude": current_lat, "current_longitude": current_lon, "current_location": "New York",
+        "pickup_latitude": pickup_lat, "pickup_longitude": pickup_lon, "pickup_location": "Chicago",
+        "dropoff_latitude": dropoff_lat, "dropoff_longitude": dropoff_lon, "dropoff_location": "Denver",
+        "accumulated_weekly_hours": 0,
+    }
+
+
+def make_legs(step_count, fixture=None):
+    """
+    Two structured legs with step_count steps between them
+    """
+    from api.fake_upstream import build_osrm_route
+    from api.routing import OSRMProvider
+
+    class Response:
+        status_code = 200
+
+        def __init__(self, payload):
+            self.payload = payload
+
+        def json(self):
+            return self.payload
+
+    steps_per_leg = max(1, step_count // 2)
+    provider = OSRMProvider(base_url="http://fixture")
+    if fixture is None:
+        coordinates = [(lon, lat) for lat, lon in WAYPOINTS]
+        # build_osrm_route adds an arrival step to every leg
+        legs = provider.parse_route_response(Response(build_osrm_route(coordinates, steps_per_leg - 1)), WAYPOINTS)
+        for leg in legs:
+            driven = [step for step in leg["steps"] if step["distance"] > 0]
+            stretch = STEP_MILES / driven[0]["distance"]
+            for step in driven:
+                step["distance"] *= stretch
+                step["duration"] *= stretch
+            leg["total_distance"] *= stretch
+            leg["total_duration"] *= stretch
+        return legs
+
+    recorded = fixture["routes"][0]["legs"][0]
+    legs = []
+    for end_lat, end_lon in WAYPOINTS[1:]:
+        steps = [recorded["steps"][index % len(recorded["steps"])] for index in range(steps_per_leg)]
+        legs.append({
+            "distance": sum(step["distance"] for step in steps),
+            "duration": sum(step["duration"] for step in steps),
+            "steps": steps,
+        })
+    return provider.parse_route_response(Response({"routes": [{"legs": legs}]}), WAYPOINTS)
+
+
+def time_call(function, repeats):
+    """
+    Run function `repeats` times; returns (last result, timing dict in milliseconds)
+    """
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, {
+        "best_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "repeats": repeats,
+    }
+
+
+def measure_memory(function):
+    """
+    Peak traced memory while function runs, plus what it still holds afterwards
+    """
+    tracemalloc.start()
+    try:
+        result = function()
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    statistics_ = snapshot.statistics("filename")
+    return result, {
+        "peak_bytes": peak,
+        "retained_bytes": sum(stat.size for stat in statistics_),
+        "retained_blocks": sum(stat.count for stat in statistics_),
+    }
+
+
+def bench_engine(step_counts, repeats, fixture=None):
+    from api.eld import plan_trip_dict
+
+    results = []
+    for step_count in step_counts:
+        legs = make_legs(step_count, fixture)
+        plan = lambda: plan_trip_dict(make_trip(), legs)  # noqa: E731
+        result, timing = time_call(plan, repeats)
+        _, memory = measure_memory(plan)
+        results.append({
+            "steps": sum(len(leg["steps"]) for leg in legs),
+            "days": result["total_days"],
+            "entries": sum(len(day["logs"]) for day in result["daily_summaries"]),
+            **timing,
+            **memory,
+        })
+    return results
+
+
+def bench_endpoints(repeats, trip_count):
+    from django.test.utils import setup_test_environment
+    from rest_framework.test import APIClient
+
+    from api.models import CustomUser, GeocodeCacheEntry, RouteCacheEntry, Trip, TripEldLog
+
+    setup_test_environment()
+    user = CustomUser.objects.create_user(username="benchmark", password="benchmark")
+    trip_fields = {
+        key: value for key, value in make_trip().items()
+        if key not in ("id", "accumulated_weekly_hours")
+    }
+    trips = Trip.objects.bulk_create([
+        Trip(user=user, current_cycle_used=10, **trip_fields) for _ in range(trip_count)
+    ])
+    client = APIClient()
+    client.force_authenticate(user)
+
+    def get(path, **params):
+        response = client.get(path, params)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+        return response
+
+    def trip_details_cold():
+        TripEldLog.objects.all().delete()
+        RouteCacheEntry.objects.all().delete()
+        return get(f"/api/trip-details/{trips[0].id}/")
+
+    def reverse_cold():
+        GeocodeCacheEntry.objects.all().delete()
+        return get("/api/reverse-geocode/", lat=40.7128, lon=-74.0060)
+
+    cases = [
+        ("trip_details_cold", trip_details_cold),
+        ("trip_details_stored", lambda: get(f"/api/trip-details/{trips[0].id}/")),
+        ("trip_list", lambda: get("/api/trips/")),
+        ("reverse_coordinates_cold", reverse_cold),
+        ("reverse_coordinates_cached", lambda: get("/api/reverse-geocode/", lat=40.7128, lon=-74.0060)),
+    ]
+    results = {}
+    for name, case in cases:
+        _, timing = time_call(case, repeats)
+        _, memory = measure_memory(case)
+        results[name] = {**timing, "peak_bytes": memory["peak_bytes"]}
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path, after_path):
+    """
+    Print best_ms and peak_bytes of two result files side by side
+    """
+    before = json.loads(Path(before_path).read_text())
+    after = json.loads(Path(after_path).read_text())
+
+    def rows(results):
+        for entry in results.get("engine", []):
+            yield f"engine {entry['steps']} steps", entry
+        for name, entry in results.get("endpoints", {}).items():
+            yield name, entry
+
+    previous = dict(rows(before))
+    print(f"{before.get('revision')} -> {after.get('revision')}")
+    print(f"{'benchmark':<30} {'best ms':>20} {'change':>8} {'peak KiB':>20} {'change':>8}")
+    for name, entry in rows(after):
+        old = previous.get(name)
+        if old is None:
+            continue
+        time_change = entry["best_ms"] / old["best_ms"] - 1 if old["best_ms"] else 0
+        memory_change = entry["peak_bytes"] / old["peak_bytes"] - 1 if old["peak_bytes"] else 0
+        print(f"{name:<30} {old['best_ms']:>9.2f} {entry['best_ms']:>10.2f} {time_change:>+8.1%} "
+              f"{old['peak_bytes'] / 1024:>9.0f} {entry['peak_bytes'] / 1024:>10.0f} {memory_change:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="write results here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files and exit")
+    parser.add_argument("--only", choices=["engine", "endpoints"])
+    parser.add_argument("--steps", type=int, nargs="+", default=STEP_COUNTS)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--trips", type=int, default=200, help="trips in the listed account")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake upstream latency in seconds")
+    parser.add_argument("--osrm-fixture", type=Path, help="saved OSRM /route JSON response to build routes from")
+    options = parser.parse_args()
+
+    if options.compare:
+        return compare(*options.compare)
+
+    workdir = tempfile.TemporaryDirectory()
+    os.environ.update({
+        "DJANGO_SETTINGS_MODULE": "backend.settings",
+        "DATABASE_URL": f"sqlite:///{workdir.name}/benchmark.db",
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark-secret-key-that-is-long-enough"),
+    })
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.test import override_settings
+
+    from api import http_client
+    from api.fake_upstream import FakeUpstream
+
+    fixture = json.loads(options.osrm_fixture.read_text()) if options.osrm_fixture else None
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    if options.only in (None, "engine"):
+        results["engine"] = bench_engine(options.steps, options.repeats, fixture)
+    if options.only in (None, "endpoints"):
+        call_command("migrate", verbosity=0)
+        with FakeUpstream(latency=options.latency) as upstream, override_settings(
+            OSRM_URL=upstream.url,
+            ROUTING_PROVIDER={"BACKEND": "api.routing.OSRMProvider"},
+            GEOCODE_URL=upstream.url + "/reverse",
+            NOMINATIM_URL=upstream.url + "/reverse",
+            GEOCODE_LOCAL_ONLY=False,
+            ELD_GAZETTEER="",
+        ):
+            http_client.reset_clients()
+            results["endpoints"] = bench_endpoints(options.repeats, options.trips)
+        results["endpoints_latency_s"] = options.latency
+
+    report = json.dumps(results, indent=2)
+    if options.output:
+        Path(options.output).write_text(report + "\n")
+    else:
+        print(report)
+    workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -128,6 +128,8 @@ const TripCard = ({ trip, onEdit, onDelete }: any) => {
 // Main component
 const TripsPage = () => {
   const [trips, setTrips] = useState<Trip[]>([]);
+  // Cursor URL of the next (older) page of trips, null once everything is loaded
+  const [nextPageUrl, setNextPageUrl] = useState<string | null>(null);
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [isLoading, setIsLoading] = useState(false);
 
@@ -166,7 +168,22 @@ const TripsPage = () => {
     setIsLoading(true);
     try {
       const response = await api.get("/api/trips/");
-      setTrips(response.data);
+      setTrips(response.data.results);
+      setNextPageUrl(response.data.next);
+    } catch (error) {
+      console.error("Error fetching trips:", error);
+    } finally {
+      setIsLoading(false);
+    }
+  };
+
+  const fetchMoreTrips = async () => {
+    if (!nextPageUrl) return;
+    setIsLoading(true);
+    try {
+      const response = await api.get(nextPageUrl);
+      setTrips([...trips, ...response.data.results]);
+      setNextPageUrl(response.data.next);
     } catch (error) {
       console.error("Error fetching trips:", error);
     } finally {
@@ -263,7 +280,7 @@ const TripsPage = () => {
         );
       } else {
         response = await api.post("/api/trips/", tripData);
-        setTrips([...trips, response.data]);
+        setTrips([response.data, ...trips]);
       }
 
       setIsModalOpen(false);
@@ -313,16 +330,29 @@ const TripsPage = () => {
           </Button>
         </div>
       ) : (
-        <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-4 md:gap-6">
-          {trips.map((trip) => (
-            <TripCard
-              key={trip.id}
-              trip={trip}
-              onEdit={handleEditTrip}
-              onDelete={handleDeleteTrip}
-            />
-          ))}
-        </div>
+        <>
+          <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-4 md:gap-6">
+            {trips.map((trip) => (
+              <TripCard
+                key={trip.id}
+                trip={trip}
+                onEdit={handleEditTrip}
+                onDelete={handleDeleteTrip}
+              />
+            ))}
+          </div>
+          {nextPageUrl && (
+            <div className="flex justify-center mt-6">
+              <Button
+                variant="outline"
+                onClick={fetchMoreTrips}
+                disabled={isLoading}
+              >
+                {isLoading ? "Loading..." : "Load More Trips"}
+              </Button>
+            </div>
+          )}
+        </>
       )}
 
       <Dialog